@@ -0,0 +1,54 @@
+"""
+Timestamp codec: native BSON dates on write, tolerant decoding on read.
+
+Documents used to store created_at/updated_at/expires_at as isoformat()
+strings. New writes store timezone-aware datetimes (BSON dates, always UTC)
+and the client is opened with CODEC_OPTIONS so they come back aware. Until
+scripts/migrate_dates.py has converted the existing rows, code that needs a
+real datetime goes through as_datetime(), which accepts both.
+
+Note that while a collection still holds both formats, range queries and
+sorts on that field only match/order the values of one BSON type; run the
+migration before relying on date comparisons.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from bson.codec_options import CodecOptions
+
+CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+
+# Timestamp fields per collection, as written by server.py and outbox.py
+DATE_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "users": ("created_at",),
+    "user_sessions": ("created_at", "expires_at"),
+    "password_reset_tokens": ("created_at", "expires_at"),
+    "products": ("created_at",),
+    "carts": ("updated_at",),
+    "orders": ("created_at", "updated_at"),
+    "user_addresses": ("created_at",),
+    "payment_transactions": ("created_at", "updated_at"),
+    "product_reviews": ("created_at",),
+    "wishlist": ("created_at",),
+    "coupons": ("created_at", "expires_at"),
+    "shipping_tracking": ("updated_at", "estimated_delivery"),
+    "order_returns": ("created_at", "updated_at"),
+    "contact_messages": ("created_at",),
+    "outbox": ("created_at", "updated_at", "next_attempt_at", "locked_until"),
+}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Aware UTC datetime from a BSON date, a naive datetime or a legacy ISO string."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
@@ -0,0 +1,134 @@
+"""
+Read-through cache for catalog (product) reads, versioned by a generation.
+
+Entries are keyed by (generation, query key). Any write that changes what a
+product read returns (admin product edits, image uploads, stock reserved or
+released by orders) calls bump(), which increments the generation stored in
+a single version document and drops the local entries. Other API workers
+poll that document (one _id lookup per poll_interval) and drop their entries
+when the generation moves, so a write is visible everywhere within one poll.
+Concurrent misses on the same key share one database query.
+
+Writes to searchable product content (create/update/delete) also bump a
+separate content_generation; listeners (the search index rebuild) are only
+called when that one moves, so checkout traffic does not trigger rebuilds.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from cachetools import LRUCache
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+VERSION_ID = "catalog"
+
+
+class CatalogCache:
+    def __init__(self, versions, maxsize: int = 1024, poll_interval: float = 1.0):
+        self.versions = versions
+        self.poll_interval = poll_interval
+        self.generation = 0
+        self.content_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: LRUCache = LRUCache(maxsize=maxsize)
+        # key -> [lock, callers holding or waiting on it]
+        self._locks: Dict[Hashable, list] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Called whenever another worker is seen to have changed product content."""
+        self._listeners.append(callback)
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry_key = (self.generation, key)
+        if entry_key in self._entries:
+            self.hits += 1
+            return self._entries[entry_key]
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                entry_key = (self.generation, key)
+                if entry_key in self._entries:
+                    self.hits += 1
+                    return self._entries[entry_key]
+                self.misses += 1
+                value = await compute()
+                # Skip caching if a bump landed while this was being read
+                if entry_key[0] == self.generation:
+                    self._entries[entry_key] = value
+                return value
+        finally:
+            # Drop the lock only once nobody is holding or queued on it
+            slot[1] -= 1
+            if not slot[1]:
+                self._locks.pop(key, None)
+
+    def _advance(self, generation: int) -> None:
+        if generation != self.generation:
+            self.generation = generation
+            self._entries.clear()
+
+    async def bump(self, content: bool = False) -> None:
+        """content=True for writes that change searchable product fields, not just stock."""
+        # Drop local entries first so this worker never serves the old data again
+        self._entries.clear()
+        increments = {"generation": 1, "content_generation": 1} if content else {"generation": 1}
+        doc = await self.versions.find_one_and_update(
+            {"_id": VERSION_ID},
+            {"$inc": increments},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._advance(doc["generation"])
+        # The writer updates its own search index directly, so listeners only
+        # run if the $inc also carried content changes made by another worker
+        expected = self.content_generation + (1 if content else 0)
+        self.content_generation = doc.get("content_generation", 0)
+        if self.content_generation != expected:
+            self._notify()
+
+    async def poll(self) -> None:
+        doc = await self.versions.find_one({"_id": VERSION_ID}) or {}
+        self._advance(doc.get("generation", 0))
+        content_generation = doc.get("content_generation", 0)
+        if content_generation != self.content_generation:
+            self.content_generation = content_generation
+            self._notify()
+
+    def _notify(self) -> None:
+        for callback in self._listeners:
+            callback()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            await self._task
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Catalog version poll failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "content_generation": self.content_generation,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,148 @@
+"""
+Declarative index registry for every collection the API queries.
+
+ensure_indexes() runs at startup and is idempotent (create_index is a no-op
+when an identical index exists). verify_query_shapes() explains each query
+shape the routes issue and reports any that fall back to a COLLSCAN; it is
+used by scripts/manage_indexes.py verify.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options)
+INDEXES: List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]] = [
+    ("users", [("id", ASCENDING)], {"unique": True}),
+    ("users", [("email", ASCENDING)], {"unique": True}),
+    ("users", [("role", ASCENDING)], {}),
+    ("user_sessions", [("session_token", ASCENDING)], {"unique": True}),
+    ("user_sessions", [("user_id", ASCENDING)], {}),
+    # TTL: MongoDB deletes rows once expires_at (a BSON date) has passed
+    ("user_sessions", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("password_reset_tokens", [("token", ASCENDING)], {"unique": True}),
+    ("password_reset_tokens", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ("products", [("id", ASCENDING)], {"unique": True}),
+    ("products", [("sku", ASCENDING)], {}),
+    ("products", [("category", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("products", [("featured", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("products", [("created_at", DESCENDING), ("id", DESCENDING)], {}),
+    ("products", [("price", ASCENDING), ("id", ASCENDING)], {}),
+    ("products", [("name.en", ASCENDING), ("id", ASCENDING)], {}),
+    ("products", [("sizes_stock.stock", ASCENDING)], {}),
+    # Upload dedup: find an existing srcset entry for a content-addressed URL
+    ("products", [("image_variants.src", ASCENDING)], {}),
+    ("carts", [("user_id", ASCENDING)], {"unique": True}),
+    ("shipping_regions", [("id", ASCENDING)], {"unique": True}),
+    ("orders", [("id", ASCENDING)], {"unique": True}),
+    ("orders", [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("orders", [("created_at", DESCENDING)], {}),
+    ("orders", [("status", ASCENDING)], {}),
+    ("user_addresses", [("user_id", ASCENDING), ("id", ASCENDING)], {}),
+    ("user_addresses", [("id", ASCENDING)], {"unique": True}),
+    ("payment_transactions", [("session_id", ASCENDING)], {"unique": True}),
+    ("product_reviews", [("product_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("product_reviews", [("product_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+    ("wishlist", [("user_id", ASCENDING), ("product_id", ASCENDING)], {"unique": True}),
+    ("coupons", [("code", ASCENDING)], {"unique": True}),
+    ("shipping_tracking", [("order_id", ASCENDING)], {"unique": True}),
+    ("order_returns", [("order_id", ASCENDING)], {"unique": True}),
+    ("order_returns", [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ("order_returns", [("id", ASCENDING)], {"unique": True}),
+    ("order_returns", [("created_at", DESCENDING)], {}),
+    ("contact_messages", [("id", ASCENDING)], {"unique": True}),
+    ("contact_messages", [("created_at", DESCENDING)], {}),
+    ("sales_daily", [("day", ASCENDING), ("region", ASCENDING), ("product_id", ASCENDING), ("status", ASCENDING)], {"unique": True}),
+    ("sales_daily", [("product_id", ASCENDING), ("status", ASCENDING)], {}),
+    ("outbox", [("id", ASCENDING)], {"unique": True}),
+    ("outbox", [("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+    ("outbox", [("status", ASCENDING), ("locked_until", ASCENDING)], {}),
+]
+
+# (collection, filter, sort) for every find shape the routes issue.
+# Values are placeholders; only the shape matters to the planner.
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("users", {"id": "x"}, None),
+    ("users", {"email": "x"}, None),
+    ("users", {"email": "x", "role": "admin"}, None),
+    ("users", {"role": "customer"}, None),
+    ("user_sessions", {"session_token": "x"}, None),
+    ("password_reset_tokens", {"token": "x", "used": False}, None),
+    ("user_sessions", {"expires_at": {"$type": "string"}}, None),
+    ("password_reset_tokens", {"expires_at": {"$type": "string"}}, None),
+    ("products", {"id": "x"}, None),
+    ("products", {"id": {"$in": ["x", "y"]}}, None),
+    ("products", {"category": "men"}, None),
+    ("products", {"featured": True}, None),
+    ("products", {"image_variants.src": "/uploads/x.png"}, None),
+    ("products", {}, [("created_at", DESCENDING)]),
+    ("products", {}, [("price", ASCENDING)]),
+    ("products", {}, [("name.en", ASCENDING)]),
+    ("products", {"$or": [{"price": {"$gt": 1}}, {"price": 1, "id": {"$gt": "x"}}]}, [("price", ASCENDING), ("id", ASCENDING)]),
+    ("products", {"$or": [{"created_at": {"$lt": "x"}}, {"created_at": "x", "id": {"$lt": "x"}}]}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("carts", {"user_id": "x"}, None),
+    ("shipping_regions", {"id": "x"}, None),
+    ("orders", {"id": "x"}, None),
+    ("orders", {"id": "x", "user_id": "x"}, None),
+    ("orders", {"user_id": "x"}, [("created_at", DESCENDING)]),
+    ("orders", {}, [("created_at", DESCENDING)]),
+    ("orders", {"status": "pending"}, None),
+    ("user_addresses", {"user_id": "x"}, None),
+    ("user_addresses", {"id": "x", "user_id": "x"}, None),
+    ("payment_transactions", {"session_id": "x"}, None),
+    ("payment_transactions", {"session_id": "x", "user_id": "x"}, None),
+    ("product_reviews", {"product_id": "x"}, [("created_at", DESCENDING)]),
+    ("product_reviews", {"product_id": "x", "user_id": "x"}, None),
+    ("wishlist", {"user_id": "x"}, None),
+    ("wishlist", {"user_id": "x", "product_id": "x"}, None),
+    ("coupons", {"code": "X", "active": True}, None),
+    ("shipping_tracking", {"order_id": "x"}, None),
+    ("order_returns", {"order_id": "x"}, None),
+    ("order_returns", {"user_id": "x"}, [("created_at", DESCENDING)]),
+    ("order_returns", {}, [("created_at", DESCENDING)]),
+    ("order_returns", {"id": "x"}, None),
+    ("contact_messages", {}, [("created_at", DESCENDING)]),
+    ("contact_messages", {"id": "x"}, None),
+    ("sales_daily", {"day": {"$gte": "x", "$lte": "x"}, "product_id": None, "status": {"$nin": ["cancelled"]}}, None),
+    # OutboxWorker._claim: due pending jobs, or jobs whose sending lock expired
+    ("outbox", {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": "x"}},
+        {"status": "sending", "locked_until": {"$lte": "x"}}
+    ]}, [("next_attempt_at", ASCENDING)]),
+    ("outbox", {"id": "x"}, None),
+]
+
+
+async def ensure_indexes(db) -> None:
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            # e.g. duplicate data blocking a unique index; keep serving
+            logger.error("Index %s on %s could not be created: %s", keys, collection, e)
+
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+async def verify_query_shapes(db) -> List[str]:
+    """Return a description of every query shape whose winning plan scans the collection."""
+    failures = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            failures.append(f"{collection} find({query}) sort({sort})")
+    return failures
@@ -0,0 +1,90 @@
+"""
+Expiry of user_sessions and password_reset_tokens.
+
+Both collections carry a TTL index on expires_at (see db_indexes), so the
+MongoDB TTL monitor deletes rows shortly after they expire (it runs about
+once a minute; readers still check expires_at themselves). TTL only applies
+to BSON dates, so rows still holding legacy ISO strings would live forever:
+LegacyExpirySweeper deletes the expired ones and converts the rest to dates,
+after which the TTL index takes them over. Once no string rows remain, a
+sweep is a single indexed query that returns nothing.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import DeleteOne, UpdateOne
+
+from bson_dates import as_datetime
+
+logger = logging.getLogger(__name__)
+
+EXPIRING_COLLECTIONS = ("user_sessions", "password_reset_tokens")
+
+
+class LegacyExpirySweeper:
+    def __init__(self, db, collections: Iterable[str] = EXPIRING_COLLECTIONS, interval: float = 300.0,
+                 batch_size: int = 500):
+        self.db = db
+        self.collections = tuple(collections)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deleted = 0
+        self.converted = 0
+        self.last_run: Optional[datetime] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            await self._task
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Legacy expiry sweep failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def sweep(self) -> None:
+        for name in self.collections:
+            await self._sweep_collection(self.db[name])
+        self.last_run = datetime.now(timezone.utc)
+
+    async def _sweep_collection(self, collection) -> None:
+        while True:
+            docs = await collection.find(
+                {"expires_at": {"$type": "string"}}, {"expires_at": 1}
+            ).to_list(self.batch_size)
+            if not docs:
+                return
+            now = datetime.now(timezone.utc)
+            ops = []
+            for doc in docs:
+                try:
+                    expires_at = as_datetime(doc["expires_at"])
+                except ValueError:
+                    # Unparseable expiry can never be honoured by the readers either
+                    expires_at = now
+                original = {"_id": doc["_id"], "expires_at": doc["expires_at"]}
+                if expires_at <= now:
+                    ops.append(DeleteOne(original))
+                else:
+                    ops.append(UpdateOne(original, {"$set": {"expires_at": expires_at}}))
+            result = await collection.bulk_write(ops, ordered=False)
+            self.deleted += result.deleted_count
+            self.converted += result.modified_count
+            if len(docs) < self.batch_size:
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {"deleted": self.deleted, "converted": self.converted, "last_run": self.last_run}
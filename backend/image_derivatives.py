@@ -0,0 +1,125 @@
+"""
+Resized WebP/JPEG derivatives of product images, for srcset.
+
+render_derivatives() runs in a worker process (Pillow decoding and
+resampling are CPU-bound and would stall the event loop). Derivatives are
+written next to the content-addressed original as <sha256>-<width>.<ext>
+(in the storage staging directory) and then published with it.
+
+A product's image_variants entry looks like
+    {"src": "/uploads/<sha>.png", "width": 1200, "height": 1500,
+     "srcset": {"webp": "/uploads/<sha>-160.webp 160w, ...", "jpeg": "..."}}
+Remote images on a host with URL-based resizing (the Unsplash images in the
+seed data) get an equivalent entry built from query parameters instead.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from PIL import Image, ImageOps
+
+DERIVATIVE_WIDTHS = (160, 400, 800, 1600)
+
+# srcset key -> (Pillow format, file extension, save options)
+OUTPUT_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# host -> (format param, {srcset key: format value}); width goes in "w"
+REMOTE_RESIZERS = {
+    "images.unsplash.com": ("fm", {"webp": "webp", "jpeg": "jpg"}),
+}
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """Composite any alpha channel onto white; JPEG cannot store transparency."""
+    if image.mode == "RGBA":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image
+
+
+def render_derivatives(source: str, widths: Iterable[int] = DERIVATIVE_WIDTHS) -> Dict[str, Any]:
+    """Write the derivatives of source; returns its size and [{file, width, format}]."""
+    path = Path(source)
+    with Image.open(path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        width, height = image.size
+        variants = []
+        # Never upscale: widths above the original collapse to the original width
+        for target in sorted({min(w, width) for w in widths}):
+            resized = image if target == width else image.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS
+            )
+            for key, (fmt, ext, options) in OUTPUT_FORMATS.items():
+                name = f"{path.stem}-{target}.{ext}"
+                out = path.parent / name
+                if not out.exists():
+                    temp = path.parent / f".{name}.{os.getpid()}"
+                    (_flatten(resized) if fmt == "JPEG" else resized).save(temp, fmt, **options)
+                    os.replace(temp, out)
+                variants.append({"file": name, "width": target, "format": key})
+    return {"width": width, "height": height, "variants": variants}
+
+
+def build_entry(src: str, url_for: Callable[[str], str], rendered: Dict[str, Any]) -> Dict[str, Any]:
+    srcset: Dict[str, List[str]] = {}
+    for variant in rendered["variants"]:
+        srcset.setdefault(variant["format"], []).append(f"{url_for(variant['file'])} {variant['width']}w")
+    return {
+        "src": src,
+        "width": rendered["width"],
+        "height": rendered["height"],
+        "srcset": {key: ", ".join(candidates) for key, candidates in srcset.items()},
+    }
+
+
+def remote_entry(url: str, widths: Iterable[int] = DERIVATIVE_WIDTHS) -> Optional[Dict[str, Any]]:
+    """image_variants entry for a remote image whose host resizes via query parameters."""
+    parts = urlsplit(url)
+    resizer = REMOTE_RESIZERS.get(parts.netloc)
+    if resizer is None:
+        return None
+    format_param, formats = resizer
+    params = {k: v for k, v in parse_qsl(parts.query) if k not in ("w", format_param)}
+    srcset = {}
+    for key, value in formats.items():
+        srcset[key] = ", ".join(
+            f"{urlunsplit(parts._replace(query=urlencode({**params, 'w': w, format_param: value})))} {w}w"
+            for w in widths
+        )
+    return {"src": url, "width": None, "height": None, "srcset": srcset}
+
+
+class ImageDerivativePool:
+    """Process pool for render_derivatives; processes start on first use."""
+
+    def __init__(self, max_workers: int = 2, widths: Iterable[int] = DERIVATIVE_WIDTHS):
+        self.widths = tuple(widths)
+        self.max_workers = max_workers
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that already runs Motor's threads is not safe
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def render(self, path: Path) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, render_derivatives, str(path), self.widths)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); later renders get a fresh pool
+            self._executor = self._new_executor()
+            raise
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
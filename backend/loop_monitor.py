@@ -0,0 +1,162 @@
+"""
+Event-loop lag sampling and blocking-call reports.
+
+LoopLagMonitor sleeps for interval seconds in a loop and records how late it
+woke up: that delay is the time other callbacks held the loop, i.e. what
+every request waiting on I/O at that moment paid on top of its own work.
+p50/p99/max over the last `window` samples are exported via stats().
+
+With debug enabled, a heartbeat task ticks every blocking_threshold / 2
+and a watchdog thread checks it every blocking_threshold / 8. Once the
+heartbeat is overdue, the watchdog captures the loop thread's stack while
+the loop is still blocked. When the heartbeat next runs it measures how long
+the loop was actually held and, at or above blocking_threshold, logs the
+stack with the innermost frame from application code (e.g. a requests.get
+or a bcrypt call inside a handler). Every callback longer than the
+threshold is caught, not only those still running when the lag sampler
+wakes. A loop that stays blocked is reported by the watchdog itself.
+Recent reports are kept for the stats endpoint.
+"""
+import asyncio
+import logging
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_DIRS = tuple({sysconfig.get_paths()[key] for key in ("stdlib", "platstdlib", "purelib", "platlib")})
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _offending_frame(stack: traceback.StackSummary) -> Optional[traceback.FrameSummary]:
+    """Innermost frame outside the standard library and installed packages."""
+    for frame in reversed(stack):
+        if not frame.filename.startswith(LIBRARY_DIRS) and frame.filename != __file__:
+            return frame
+    return None
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5, window: int = 600, debug: bool = False,
+                 blocking_threshold: float = 0.1, max_reports: int = 20):
+        self.interval = interval
+        self.debug = debug
+        self.blocking_threshold = blocking_threshold
+        self.blocked = 0
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=max_reports)
+        self.heartbeat_interval = blocking_threshold / 2
+        self._beat = time.monotonic()
+        # (beat, stack) captured by the watchdog while that beat was overdue
+        self._captured: Optional[tuple] = None
+        self._reported_beat: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self.run())
+        if self.debug:
+            self._heartbeat_task = asyncio.create_task(self.heartbeat())
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            await self._task
+        if self._heartbeat_task:
+            await self._heartbeat_task
+        if self._watchdog:
+            self._watchdog.join()
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                break
+            self._samples.append(max(0.0, time.monotonic() - started - self.interval))
+
+    async def heartbeat(self) -> None:
+        while not self._stopping.is_set():
+            beat = self._beat = time.monotonic()
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                break
+            held = time.monotonic() - beat - self.heartbeat_interval
+            captured = self._captured
+            if held >= self.blocking_threshold and captured and captured[0] == beat and beat != self._reported_beat:
+                self._report(held, captured[1])
+
+    def _watch(self) -> None:
+        poll = max(self.blocking_threshold / 8, 0.005)
+        # Overdue by this much: capture the stack. A callback of blocking_threshold
+        # always leaves the beat overdue by >= threshold / 2 - poll, so it is seen.
+        capture_after = self.blocking_threshold / 4
+        stalled_after = max(1.0, 10 * self.blocking_threshold)
+        while not self._stopping.is_set():
+            time.sleep(poll)
+            beat = self._beat
+            overdue = time.monotonic() - beat - self.heartbeat_interval
+            if overdue < capture_after:
+                continue
+            if self._captured is None or self._captured[0] != beat:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                self._captured = (beat, traceback.extract_stack(frame))
+            elif overdue >= stalled_after and beat != self._reported_beat:
+                # Still blocked: report now rather than when (if) the loop comes back
+                self._report(overdue, self._captured[1])
+                self._reported_beat = beat
+
+    def _report(self, held: float, stack: traceback.StackSummary) -> None:
+        self.blocked += 1
+        offender = _offending_frame(stack)
+        location = f"{offender.name} ({Path(offender.filename).name}:{offender.lineno})" if offender else "unknown"
+        formatted = "".join(stack.format())
+        self._reports.append({
+            "at": datetime.now(timezone.utc),
+            "held_ms": round(held * 1000, 1),
+            "handler": location,
+            "stack": formatted,
+        })
+        logger.warning("Event loop blocked for %.0f ms in %s\n%s", held * 1000, location, formatted)
+
+    def quantile(self, q: float) -> float:
+        return _percentile(sorted(self._samples), q)
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._samples)
+        return {
+            "samples": len(ordered),
+            "lag_p50_ms": round(_percentile(ordered, 0.5) * 1000, 2),
+            "lag_p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            "lag_max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+            "debug": self.debug,
+            "blocked": self.blocked,
+            "recent_blocking": list(self._reports),
+        }
@@ -0,0 +1,193 @@
+"""
+Outbox for outbound notifications.
+
+Request handlers only insert a job into the `outbox` collection; pass the
+session of the transaction that writes the business record so the job is
+committed with it. Without one (standalone server) the job is a separate
+insert and a crash right after the record is written loses it. A background
+asyncio worker claims due jobs and delivers them over a pooled httpx client.
+Failed deliveries are retried with exponential backoff (honouring
+Retry-After on 429) and moved to status "dead" once they run out of
+attempts or hit a permanent 4xx.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None, permanent: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def enqueue(collection, kind: str, payload: Dict[str, Any], session=None) -> str:
+    now = _now()
+    job_id = str(uuid.uuid4())
+    await collection.insert_one({
+        "id": job_id,
+        "kind": kind,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now
+    }, session=session)
+    return job_id
+
+
+def _raise_for_response(resp: httpx.Response) -> None:
+    if resp.status_code < 400:
+        return
+    detail = f"HTTP {resp.status_code}: {resp.text[:200]}"
+    if resp.status_code == 429:
+        retry_after = resp.headers.get("Retry-After")
+        raise DeliveryError(detail, retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+    if resp.status_code >= 500 or resp.status_code == 408:
+        raise DeliveryError(detail)
+    raise DeliveryError(detail, permanent=True)
+
+
+async def send_whatsapp(http: httpx.AsyncClient, payload: Dict[str, Any]) -> None:
+    token = os.environ.get('WHATSAPP_TOKEN')
+    phone_id = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')
+    if not token or not phone_id:
+        raise DeliveryError("WhatsApp env vars missing", permanent=True)
+    base_url = os.environ.get('WHATSAPP_API_URL', 'https://graph.facebook.com/v17.0')
+    try:
+        resp = await http.post(
+            f"{base_url}/{phone_id}/messages",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "messaging_product": "whatsapp",
+                "to": payload["to"],
+                "type": "text",
+                "text": {"preview_url": False, "body": payload["body"]}
+            }
+        )
+    except httpx.HTTPError as e:
+        raise DeliveryError(f"{type(e).__name__}: {e}")
+    _raise_for_response(resp)
+    logger.info("WhatsApp send status %s: %s", resp.status_code, resp.text)
+
+
+HANDLERS: Dict[str, Callable[[httpx.AsyncClient, Dict[str, Any]], Awaitable[None]]] = {
+    "whatsapp": send_whatsapp,
+}
+
+
+class OutboxWorker:
+    def __init__(self, collection, handlers=None, max_attempts: int = 8, base_delay: float = 2.0,
+                 max_delay: float = 600.0, poll_interval: float = 5.0, lock_seconds: float = 60.0,
+                 http_timeout: float = 10.0):
+        self.collection = collection
+        self.handlers = handlers if handlers is not None else HANDLERS
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lock_seconds = lock_seconds
+        self.http_timeout = http_timeout
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        if self._task:
+            await self._task
+
+    def notify(self) -> None:
+        """Wake the worker so a freshly enqueued job goes out without waiting for the next poll."""
+        self._wake.set()
+
+    async def run(self) -> None:
+        limits = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+        async with httpx.AsyncClient(timeout=self.http_timeout, limits=limits) as http:
+            while not self._stopping:
+                try:
+                    job = await self._claim()
+                    if job:
+                        await self._deliver(http, job)
+                        continue
+                except Exception:
+                    logger.exception("Outbox worker iteration failed")
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = _now()
+        # A job stuck in "sending" past its lock belongs to a crashed worker
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lte": now}}
+            ]},
+            {"$set": {
+                "status": "sending",
+                "locked_until": now + timedelta(seconds=self.lock_seconds),
+                "updated_at": now
+            }},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _deliver(self, http: httpx.AsyncClient, job: Dict[str, Any]) -> None:
+        attempts = job.get("attempts", 0) + 1
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise DeliveryError(f"No handler for {job['kind']}", permanent=True)
+            await handler(http, job["payload"])
+        except DeliveryError as e:
+            now = _now()
+            if e.permanent or attempts >= self.max_attempts:
+                self.dead += 1
+                logger.error("Outbox job %s dead-lettered after %s attempt(s): %s", job["id"], attempts, e)
+                update = {"status": "dead"}
+            else:
+                self.retried += 1
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempts)
+                update = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)}
+            update.update({"attempts": attempts, "last_error": str(e), "updated_at": now})
+            await self.collection.update_one({"id": job["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+            return
+        self.sent += 1
+        await self.collection.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "sent", "attempts": attempts, "last_error": None, "updated_at": _now()},
+             "$unset": {"locked_until": ""}}
+        )
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "retried": self.retried, "dead": self.dead}
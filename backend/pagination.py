@@ -0,0 +1,96 @@
+"""
+Keyset (cursor) pagination helpers for product listings.
+
+A cursor encodes the sort name plus the (sort value, id) of the last item
+returned; the next page is everything strictly after that pair in sort
+order, so each page costs an index seek instead of skipping all earlier rows.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# sort_by -> (field, direction); id breaks ties in the same direction
+SORT_OPTIONS: Dict[str, Tuple[str, int]] = {
+    "created_at": ("created_at", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+    "name": ("name.en", 1),
+}
+DEFAULT_SORT = "created_at"
+
+# Types a sort value can have in a cursor ($date values decode to datetime)
+SCALAR_TYPES = (str, int, float, bool, datetime, type(None))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _field_value(doc: Dict[str, Any], field: str) -> Any:
+    for part in field.split("."):
+        doc = (doc or {}).get(part)
+    return doc
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and "$date" in value:
+        return datetime.fromisoformat(value["$date"])
+    return value
+
+
+def resolve_sort(sort_by: Optional[str]) -> Tuple[str, Tuple[str, int]]:
+    if sort_by not in SORT_OPTIONS:
+        sort_by = DEFAULT_SORT
+    return sort_by, SORT_OPTIONS[sort_by]
+
+
+def sort_spec(sort_by: Optional[str]) -> List[Tuple[str, int]]:
+    _, (field, direction) = resolve_sort(sort_by)
+    return [(field, direction), ("id", direction)]
+
+
+def encode_cursor(sort_by: Optional[str], doc: Dict[str, Any]) -> str:
+    sort_by, (field, _) = resolve_sort(sort_by)
+    raw = json.dumps({"s": sort_by, "v": _encode_value(_field_value(doc, field)), "id": doc["id"]})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def apply_cursor(query: Dict[str, Any], sort_by: Optional[str], cursor: Optional[str]) -> Dict[str, Any]:
+    """Return query restricted to documents after cursor (unchanged for an empty cursor)."""
+    if not cursor:
+        return query
+    sort_by, (field, direction) = resolve_sort(sort_by)
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_value, last_id = _decode_value(data["v"]), data["id"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    # Only plain values may reach the query; a dict here would be read as operators
+    if not isinstance(last_id, str) or not isinstance(last_value, SCALAR_TYPES):
+        raise InvalidCursor("Malformed cursor")
+    if data.get("s") != sort_by:
+        raise InvalidCursor("Cursor was issued for a different sort order")
+    op = "$gt" if direction == 1 else "$lt"
+    after = {"$or": [
+        {field: {op: last_value}},
+        {field: last_value, "id": {op: last_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+async def fetch_page(collection, query: Dict[str, Any], sort_by: Optional[str], cursor: Optional[str],
+                     limit: int, projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fetch one keyset page: {"products": [...], "next_cursor": str | None}."""
+    docs = await collection.find(apply_cursor(query, sort_by, cursor), projection or {"_id": 0}) \
+        .sort(sort_spec(sort_by)) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+    next_cursor = encode_cursor(sort_by, docs[limit - 1]) if len(docs) > limit else None
+    return {"products": docs[:limit], "next_cursor": next_cursor}
@@ -0,0 +1,90 @@
+"""
+bcrypt hashing off the event loop.
+
+bcrypt.hashpw/checkpw take ~250 ms of CPU each and release the GIL, so they
+run in a small dedicated thread pool. Admission is bounded: once
+max_pending hashes are queued or running, further callers get
+PasswordHasherBusy immediately instead of piling up behind the pool. A slot
+is released when the hash finishes in the pool, not when its caller stops
+waiting: a cancelled request (client disconnect) cannot stop bcrypt.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int = 4, max_pending: int = 32):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        # _pending is decremented from pool threads
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.completed = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        future = self._executor.submit(timed)
+        # Runs once the hash is done, or right away if it is cancelled before starting
+        future.add_done_callback(self._release)
+        result, wait, elapsed = await asyncio.wrap_future(future)
+        self.completed += 1
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.hash_time_total += elapsed
+        self.hash_time_max = max(self.hash_time_max, elapsed)
+        return result
+
+    def _release(self, future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed: Union[str, bytes]) -> bool:
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / self.completed * 1000, 2) if self.completed else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "hash_time_avg_ms": round(self.hash_time_total / self.completed * 1000, 2) if self.completed else 0.0,
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 2),
+        }
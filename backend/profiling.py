@@ -0,0 +1,257 @@
+"""
+On-demand profiling of single requests, and tracemalloc snapshot diffs.
+
+A request sent with "X-Profile: 1" (or ?_profile=1) by an admin runs under
+a wall-clock stack sampler. A thread samples the request's task every
+`interval` seconds: while the task is running on the loop, the loop
+thread's stack is recorded; while it is suspended, its await chain is
+recorded with an "<await ...>" leaf, so time spent waiting on Mongo or
+another service shows up as well as CPU time. Each sample is weighted by the
+microseconds since the previous one: while the request burns CPU the sampler
+only gets the GIL every switch interval (5 ms), so counting samples would
+understate CPU hot spots against await time. Stacks are written in the
+collapsed-stack format ("a;b;c <microseconds>" per line) that flamegraph.pl,
+speedscope and inferno read, and the response carries X-Profile-Id.
+
+Other requests served concurrently on the same loop are not attributed to
+the profiled one. Profiles and memory snapshots are per worker process.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from metrics import route_template
+
+PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class TaskSampler:
+    def __init__(self, task: asyncio.Task, interval: float, skip_code=None):
+        self.task = task
+        self.interval = interval
+        # Frames up to and including skip_code (the middleware) are dropped
+        self.skip_code = skip_code
+        # stack -> microseconds
+        self.samples: Counter = Counter()
+        self.count = 0
+        self._thread_id = threading.get_ident()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stopping.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stopping.wait(self.interval):
+            stack = self._stack()
+            now = time.perf_counter()
+            if stack:
+                self.samples[";".join(stack)] += int((now - last) * 1e6)
+                self.count += 1
+            last = now
+
+    def _stack(self) -> List[str]:
+        coro = self.task.get_coro()
+        root = getattr(coro, "cr_frame", None)
+        if root is None:
+            return []
+        chain = []
+        frame = sys._current_frames().get(self._thread_id)
+        while frame is not None:
+            if frame.f_code is _STOP_CODE:
+                # The request is over and the middleware is joining this thread
+                return []
+            chain.append(frame.f_code)
+            if frame is root:
+                # The task is running: the loop thread's stack is its stack
+                return self._trim(reversed(chain))
+            frame = frame.f_back
+        # Suspended: follow the await chain down to what it is waiting on
+        codes = []
+        awaiting = coro
+        while getattr(awaiting, "cr_frame", None) is not None:
+            codes.append(awaiting.cr_frame.f_code)
+            awaiting = awaiting.cr_await
+        stack = self._trim(codes)
+        if stack:
+            stack.append(f"<await {type(awaiting).__name__}>")
+        return stack
+
+    def _trim(self, codes) -> List[str]:
+        codes = list(codes)
+        if self.skip_code in codes:
+            codes = codes[codes.index(self.skip_code) + 1:]
+        return [_label(code) for code in codes]
+
+
+_STOP_CODE = TaskSampler.stop.__code__
+
+
+def collapsed(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfileStore:
+    """Collapsed-stack files plus a small JSON sidecar, in a directory shared by the workers.
+
+    Blocking file I/O: call from a thread. save() keeps only the newest `keep` profiles.
+    """
+
+    def __init__(self, directory: Path, keep: int = 200):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, profile_id: str, samples: Counter, meta: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{profile_id}.folded").write_text(collapsed(samples))
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta))
+        self._prune()
+
+    def _prune(self) -> None:
+        # Ids start with the epoch second, so name order is age order
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[self.keep:]:
+            path.with_suffix(".folded").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append({"id": path.stem, **json.loads(path.read_text())})
+            except FileNotFoundError:
+                # Pruned by another worker in the meantime
+                continue
+        return profiles
+
+    def read(self, profile_id: str) -> Optional[str]:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            return (self.directory / f"{profile_id}.folded").read_text()
+        except FileNotFoundError:
+            return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, authorize: Callable[[Request], Awaitable[Any]], store: ProfileStore,
+                 interval: float = 0.001):
+        self.app = app
+        self.authorize = authorize
+        self.store = store
+        self.interval = interval
+
+    def _requested(self, request: Request) -> bool:
+        return request.headers.get("x-profile") == "1" or request.query_params.get("_profile") == "1"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        if not self._requested(request):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.authorize(request)
+        except HTTPException:
+            # Not an admin: serve the request as usual, unprofiled
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        sampler = TaskSampler(asyncio.current_task(), self.interval, skip_code=ProfilingMiddleware.__call__.__code__)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            samples = sampler.stop()
+            await asyncio.to_thread(self.store.save, profile_id, samples, {
+                "method": scope["method"],
+                "route": route_template(scope),
+                "path": scope["path"],
+                "duration_ms": round(duration * 1000, 2),
+                "samples": sampler.count,
+                "sampled_ms": round(sum(samples.values()) / 1000, 2),
+                "pid": os.getpid(),
+            })
+
+
+class MemorySnapshots:
+    """tracemalloc baseline + diff. Tracing slows allocation down, so stop it when done."""
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "pid": os.getpid(),
+            "tracing": tracemalloc.is_tracing(),
+            "has_baseline": self.baseline is not None,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+        }
+
+    def snapshot(self, frames: int = 1) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = self._take()
+        return self.status()
+
+    def diff(self, limit: int = 25, group_by: str = "lineno") -> List[Dict[str, Any]]:
+        if self.baseline is None or not tracemalloc.is_tracing():
+            raise ValueError("No baseline snapshot")
+        stats = self._take().compare_to(self.baseline, group_by)
+        return [{
+            "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+            "count": stat.count,
+        } for stat in stats[:limit]]
+
+    def stop(self) -> Dict[str, Any]:
+        tracemalloc.stop()
+        self.baseline = None
+        return self.status()
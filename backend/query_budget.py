@@ -0,0 +1,145 @@
+"""
+Per-request accounting of MongoDB round trips.
+
+QueryBudgetMiddleware puts a QueryTracker in a context variable for each
+HTTP request; QueryBudgetListener (registered on the Motor client) adds every
+command issued from that context to it. Motor runs pymongo on a thread pool
+but copies the caller's context, so commands are attributed to the request
+that awaited them, including ones issued from asyncio.gather.
+
+After the response, a warning is logged when the route went over the call
+budget or repeated one query shape (same command, collection and filter
+keys, different values) enough times to look like an N+1 loop. With
+debug_headers, X-DB-Calls and X-DB-Time (ms) are added to the response.
+"""
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+# Cursor continuation and session bookkeeping are not separate queries
+IGNORED_SHAPES = {"getMore", "killCursors", "endSessions"}
+
+# command -> where its filter lives
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+
+
+def _shape(value: Any) -> str:
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{key}:{_shape(value[key])}" for key in sorted(value)) + "}"
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            # Pipelines, $or/$and clauses
+            return "[" + ",".join(_shape(item) for item in value) + "]"
+        # $in lists and the like: the length is a value, not part of the shape
+        return "[]"
+    return "?"
+
+
+def query_shape(command_name: str, command) -> Tuple[str, str, str]:
+    collection = command.get(command_name)
+    if command_name in ("update", "delete"):
+        statements = command.get(command_name + "s") or [{}]
+        shape = _shape(statements[0].get("q", {}))
+    elif command_name in FILTER_FIELDS:
+        shape = _shape(command.get(FILTER_FIELDS[command_name], {}))
+    else:
+        shape = ""
+    return command_name, collection if isinstance(collection, str) else "-", shape
+
+
+class QueryTracker:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def started(self, command_name: str, command) -> None:
+        shape = None if command_name in IGNORED_SHAPES else query_shape(command_name, command)
+        with self._lock:
+            self.calls += 1
+            if shape:
+                self.shapes[shape] += 1
+
+    def finished(self, seconds: float) -> None:
+        with self._lock:
+            self.seconds += seconds
+
+    def repeated(self, threshold: int) -> List[Tuple[Tuple[str, str, str], int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+current_tracker: ContextVar[Optional[QueryTracker]] = ContextVar("current_tracker", default=None)
+
+
+class QueryBudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        tracker = current_tracker.get()
+        if tracker is not None:
+            tracker.started(event.command_name, event.command)
+
+    def succeeded(self, event):
+        tracker = current_tracker.get()
+        if tracker is not None:
+            tracker.finished(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, app, max_calls: int = 20, repeat_threshold: int = 5, debug_headers: bool = False):
+        self.app = app
+        self.max_calls = max_calls
+        self.repeat_threshold = repeat_threshold
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tracker = QueryTracker()
+        token = current_tracker.set(tracker)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.debug_headers:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-calls", str(tracker.calls).encode()),
+                    (b"x-db-time", f"{tracker.seconds * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_tracker.reset(token)
+            self._report(scope, tracker)
+
+    def _report(self, scope, tracker: QueryTracker) -> None:
+        if not tracker.calls:
+            return
+        route = f"{scope['method']} {route_template(scope)}"
+        if tracker.calls > self.max_calls:
+            logger.warning(
+                "%s made %d Mongo calls (%.1f ms), over the budget of %d",
+                route, tracker.calls, tracker.seconds * 1000, self.max_calls
+            )
+        for (command_name, collection, shape), count in tracker.repeated(self.repeat_threshold):
+            logger.warning(
+                "%s repeated %s on %s %d times with filter %s (possible N+1)",
+                route, command_name, collection, count, shape or "-"
+            )
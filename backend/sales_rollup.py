@@ -0,0 +1,130 @@
+"""
+Incrementally maintained daily sales rollups (the `sales_daily` collection).
+
+Each row is keyed by (day, region, product_id, status), with day a native
+date at UTC midnight so report ranges are index-backed date comparisons:
+- product rows (product_id set) hold units sold and line revenue;
+- order rows (product_id None) hold order count and order revenue for the region.
+
+Rows are bucketed by the order's effective status ("returned" once a return
+is approved, otherwise the order status), so cancelling or returning an
+order moves its numbers from one bucket to another and reports can simply
+leave those buckets out. rebuild() backfills from the orders collection.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+# Buckets excluded from net-sales reports
+NON_SALE_STATUSES = ["cancelled", "returned"]
+RETURN_COUNTED_STATUSES = {"approved", "completed"}
+GRANULARITIES = ("day", "week", "month")
+
+
+def to_day(value: Any) -> datetime:
+    """UTC midnight of an ISO string or datetime."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+
+
+def effective_status(order: Dict[str, Any]) -> str:
+    if order.get("returned"):
+        return "returned"
+    status = order.get("status", "pending")
+    return getattr(status, "value", status)
+
+
+def _rows(order: Dict[str, Any]) -> List[Tuple[Tuple, Dict[str, Any], Dict[str, Any]]]:
+    """(key fields, increments, fields to set) for every rollup row the order touches."""
+    day = to_day(order["created_at"])
+    region = order.get("shipping_region")
+    rows = [((day, region, None), {"orders": 1, "revenue": order["total_amount"]}, {})]
+    lines: Dict[str, Dict[str, Any]] = {}
+    for item in order.get("items", []):
+        line = lines.setdefault(item["product_id"], {"quantity": 0, "revenue": 0.0, "product_name": item["product_name"]})
+        line["quantity"] += item["quantity"]
+        line["revenue"] += item["quantity"] * item["price"]
+    for product_id, line in lines.items():
+        rows.append((
+            (day, region, product_id),
+            {"quantity": line["quantity"], "revenue": line["revenue"]},
+            {"product_name": line["product_name"]}
+        ))
+    return rows
+
+
+def _ops(order: Dict[str, Any], status: str, sign: int) -> List[UpdateOne]:
+    ops = []
+    for (day, region, product_id), increments, fields in _rows(order):
+        ops.append(UpdateOne(
+            {"day": day, "region": region, "product_id": product_id, "status": status},
+            {"$inc": {k: sign * v for k, v in increments.items()}, **({"$set": fields} if fields else {})},
+            upsert=True
+        ))
+    return ops
+
+
+async def record_order(collection, order: Dict[str, Any]) -> None:
+    await collection.bulk_write(_ops(order, effective_status(order), 1), ordered=False)
+
+
+async def move_order(collection, order: Dict[str, Any], old_status: str, new_status: str) -> None:
+    if old_status == new_status:
+        return
+    ops = _ops(order, old_status, -1) + _ops(order, new_status, 1)
+    await collection.bulk_write(ops, ordered=False)
+
+
+async def rebuild(db, batch_size: int = 1000, target: str = "sales_daily") -> int:
+    """Recompute all rollups from orders into a temp collection and swap it in. Returns row count."""
+    totals: Dict[Tuple, Dict[str, Any]] = {}
+    async for order in db.orders.find({}, {"_id": 0}).batch_size(batch_size):
+        status = effective_status(order)
+        for (day, region, product_id), increments, fields in _rows(order):
+            row = totals.setdefault(
+                (day, region, product_id, status),
+                {"day": day, "region": region, "product_id": product_id, "status": status}
+            )
+            for k, v in increments.items():
+                row[k] = row.get(k, 0) + v
+            row.update(fields)
+
+    temp = db[f"{target}_rebuild"]
+    await temp.drop()
+    rows = list(totals.values())
+    for i in range(0, len(rows), batch_size):
+        await temp.insert_many(rows[i:i + batch_size])
+    if rows:
+        await temp.rename(target, dropTarget=True)
+    else:
+        await db[target].delete_many({})
+    return len(rows)
+
+
+def report_match(product_rows: bool, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 statuses: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Leading $match for a report: day range first so it rides the (day, ...) index."""
+    match: Dict[str, Any] = {}
+    if start or end:
+        match["day"] = {}
+        if start:
+            match["day"]["$gte"] = to_day(start)
+        if end:
+            match["day"]["$lte"] = to_day(end)
+    match["product_id"] = {"$ne": None} if product_rows else None
+    match["status"] = {"$in": statuses} if statuses else {"$nin": NON_SALE_STATUSES}
+    return match
+
+
+def period_expr(granularity: str) -> Any:
+    """Expression bucketing $day into day/week (Monday)/month periods."""
+    if granularity == "week":
+        return {"$subtract": ["$day", {"$multiply": [{"$subtract": [{"$isoDayOfWeek": "$day"}, 1]}, 86400000]}]}
+    if granularity == "month":
+        return {"$dateFromParts": {"year": {"$year": "$day"}, "month": {"$month": "$day"}, "day": 1}}
+    return "$day"
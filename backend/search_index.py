@@ -0,0 +1,196 @@
+"""
+In-process inverted index for product search.
+
+Product names, descriptions (all languages) and SKUs are normalized and
+tokenized into postings held in memory, and queries are ranked with BM25.
+A query only touches the postings of its own terms, so latency does not grow
+with catalog size the way an unanchored $regex scan does.
+
+Normalization folds Turkish dotted/dotless i (İ/I/ı -> i) and Latin
+diacritics (ş -> s, ğ -> g, ...), strips Arabic diacritics/tatweel and
+unifies alef/yeh/teh marbuta variants, so "ayakkabi" finds "Ayakkabı" and
+"احذية" finds "أحذية".
+
+rebuild() tokenizes a full catalog in a worker thread and swaps the result
+in, so a periodic rebuild does not hold the event loop; add()/remove() calls
+made while it loads and builds are replayed onto the new index before the swap.
+"""
+import asyncio
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+_PRE_FOLD = str.maketrans({"İ": "i", "I": "i", "ı": "i"})
+_ARABIC_FOLD = str.maketrans({"ٱ": "ا", "ى": "ي", "ة": "ه", "ـ": None})
+
+# Weighted term frequency per field (a light BM25F)
+FIELD_WEIGHTS = {"name": 3.0, "sku": 3.0, "description": 1.0}
+MAX_PREFIX_EXPANSIONS = 50
+PREFIX_MATCH_DISCOUNT = 0.9
+
+# Everything build() replaces; swapped as a unit by rebuild()
+_STATE = ("_postings", "_doc_terms", "_doc_len", "_meta", "_terms", "_total_len")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.translate(_PRE_FOLD))
+    # Drops Latin accents and Arabic harakat/hamza marks (all category Mn)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", text).translate(_ARABIC_FOLD).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text or ""))
+
+
+class ProductSearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ready = False
+        # (method, argument) of writes made while rebuild() runs, else None
+        self._pending: Optional[List[Tuple[str, Any]]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._terms: List[str] = []
+        self._total_len = 0.0
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def _field_terms(self, product: Dict[str, Any]) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+
+        def add(tokens: Iterable[str], weight: float):
+            for token in tokens:
+                terms[token] = terms.get(token, 0.0) + weight
+
+        for text in (product.get("name") or {}).values():
+            add(tokenize(text), FIELD_WEIGHTS["name"])
+        for text in (product.get("description") or {}).values():
+            add(tokenize(text), FIELD_WEIGHTS["description"])
+        add(tokenize(product.get("sku")), FIELD_WEIGHTS["sku"])
+        return terms
+
+    def build(self, products: Iterable[Dict[str, Any]]) -> None:
+        self._reset()
+        for product in products:
+            self.add(product)
+        self.ready = True
+
+    async def rebuild(self, load: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> None:
+        """build(await load()) in a thread, then swap the new postings in without yielding."""
+        fresh = ProductSearchIndex(self.k1, self.b)
+        self._pending = []
+        try:
+            products = await load()
+            await asyncio.to_thread(fresh.build, products)
+        finally:
+            pending, self._pending = self._pending, None
+        for method, argument in pending:
+            getattr(fresh, method)(argument)
+        for name in _STATE:
+            setattr(self, name, getattr(fresh, name))
+        self.ready = True
+
+    def add(self, product: Dict[str, Any]) -> None:
+        if self._pending is not None:
+            self._pending.append(("add", product))
+        doc_id = product["id"]
+        self._remove(doc_id)
+        terms = self._field_terms(product)
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._terms, term)
+            postings[doc_id] = tf
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        self._meta[doc_id] = {"category": product.get("category"), "price": product.get("price")}
+
+    def remove(self, doc_id: str) -> None:
+        if self._pending is not None:
+            self._pending.append(("remove", doc_id))
+        self._remove(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+        self._total_len -= self._doc_len.pop(doc_id)
+        self._meta.pop(doc_id, None)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Exact term plus indexed terms starting with token (search-as-you-type)."""
+        expansions = []
+        i = bisect_left(self._terms, token)
+        while i < len(self._terms) and len(expansions) < MAX_PREFIX_EXPANSIONS:
+            term = self._terms[i]
+            if not term.startswith(token):
+                break
+            expansions.append((term, 1.0 if term == token else PREFIX_MATCH_DISCOUNT))
+            i += 1
+        return expansions
+
+    def _matches_filters(self, doc_id: str, category: Optional[str], min_price: Optional[float],
+                         max_price: Optional[float]) -> bool:
+        meta = self._meta[doc_id]
+        if category and meta["category"] != category:
+            return False
+        price = meta["price"]
+        if min_price is not None and (price is None or price < min_price):
+            return False
+        if max_price is not None and (price is None or price > max_price):
+            return False
+        return True
+
+    def search(self, query: str, category: Optional[str] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Return [(product_id, score)] for products matching every query token, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self._doc_len:
+            return []
+        n_docs = len(self._doc_len)
+        avg_len = self._total_len / n_docs
+        scores: Optional[Dict[str, float]] = None
+        for token in tokens:
+            token_scores: Dict[str, float] = {}
+            for term, boost in self._expand(token):
+                postings = self._postings[term]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    score = boost * idf * tf * (self.k1 + 1) / (tf + norm)
+                    if score > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: scores[doc_id] + s for doc_id, s in token_scores.items()}
+            if not scores:
+                return []
+        results = [
+            (doc_id, score) for doc_id, score in scores.items()
+            if self._matches_filters(doc_id, category, min_price, max_price)
+        ]
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results
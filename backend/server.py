@@ -1,27 +1,54 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Cookie, Response, Depends, UploadFile, File, Form, Header, Request, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Cookie, Response, Depends, UploadFile, File, Form, Header, Request, Body, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, PyMongoError
 import os
+import asyncio
 import logging
+import random
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import requests
-import aiofiles
 import shutil
+import tempfile
 from enum import Enum
+from session_cache import SessionCache
+from bson_dates import CODEC_OPTIONS, as_datetime, utcnow
+from password_hasher import PasswordHasher, PasswordHasherBusy
+from db_indexes import ensure_indexes
+from outbox import OutboxWorker, enqueue as enqueue_outbox
+from expiry import LegacyExpirySweeper
+from uploads import UnsupportedImageType, UploadLimitMiddleware, UploadTooLarge, content_type_for, store_upload
+from storage import LocalStorage, storage_from_env
+from static_files import UploadFiles
+from image_derivatives import ImageDerivativePool, build_entry
+from pagination import SORT_OPTIONS, InvalidCursor, fetch_page
+from search_index import ProductSearchIndex
+from single_flight import SingleFlightCache
+from catalog_cache import CatalogCache
+import metrics
+from query_budget import QueryBudgetListener, QueryBudgetMiddleware
+from loop_monitor import LoopLagMonitor
+from profiling import MemorySnapshots, ProfileStore, ProfilingMiddleware
+import sales_rollup
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=CODEC_OPTIONS.tz_aware,
+    tzinfo=CODEC_OPTIONS.tzinfo,
+    event_listeners=[metrics.MongoCommandListener(), QueryBudgetListener()]
+)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app without a prefix
@@ -35,6 +62,83 @@ api_router = APIRouter(prefix="/api")
 # Anchor to repo root so it lives under /opt/render/project/src/frontend/public/uploads.
 UPLOAD_FOLDER = ROOT_DIR.parent / "frontend" / "public" / "uploads"
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+# Where uploads end up: this folder (served at /uploads) or an S3-compatible bucket
+storage = storage_from_env(UPLOAD_FOLDER)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+# Resized WebP/JPEG derivatives of uploaded images are rendered in worker processes
+image_pool = ImageDerivativePool(max_workers=int(os.environ.get('IMAGE_WORKERS', '2')))
+
+# Session token -> User cache used by get_current_user
+session_cache = SessionCache(
+    maxsize=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('SESSION_CACHE_TTL', '60'))
+)
+
+# bcrypt runs in a bounded thread pool; excess logins are shed with 503
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get('BCRYPT_WORKERS', '4')),
+    max_pending=int(os.environ.get('BCRYPT_MAX_PENDING', '32'))
+)
+
+# In-memory BM25 index behind /products/search; rebuilt periodically so
+# admin edits made on other workers converge
+product_search = ProductSearchIndex()
+SEARCH_INDEX_REFRESH_SECONDS = float(os.environ.get('SEARCH_INDEX_REFRESH', '300'))
+# Set when another worker changes product content (not stock), to rebuild the index early
+search_index_stale = asyncio.Event()
+
+# Product reads are cached per catalog generation; writes bump it (see catalog_cache.py)
+catalog_cache = CatalogCache(
+    db.catalog_version,
+    maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', '1024')),
+    poll_interval=float(os.environ.get('CATALOG_VERSION_POLL', '1'))
+)
+catalog_cache.add_listener(search_index_stale.set)
+SEARCH_INDEX_PROJECTION = {"_id": 0, "id": 1, "sku": 1, "name": 1, "description": 1, "category": 1, "price": 1}
+
+# Background delivery of outbound notifications (WhatsApp) from the outbox collection
+outbox_worker = OutboxWorker(
+    db.outbox,
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8')),
+    poll_interval=float(os.environ.get('OUTBOX_POLL_INTERVAL', '5'))
+)
+
+# Sessions/reset tokens expire via TTL indexes; this handles rows with legacy string dates
+expiry_sweeper = LegacyExpirySweeper(db, interval=float(os.environ.get('EXPIRY_SWEEP_INTERVAL', '300')))
+
+# Prometheus scrape endpoint (/metrics); set METRICS_TOKEN to require a bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+LIVE_SESSIONS = metrics.REGISTRY.register(metrics.Gauge("app_live_sessions", "Unexpired user sessions."))
+metrics.REGISTRY.register(metrics.Gauge("app_session_cache_entries", "Entries in the session cache.")).set_function(
+    lambda: session_cache.stats()["size"]
+)
+metrics.REGISTRY.register(metrics.Gauge("app_password_hashes_pending", "bcrypt jobs queued or running.")).set_function(
+    lambda: password_hasher.stats()["pending"]
+)
+metrics.REGISTRY.register(metrics.Gauge("app_catalog_generation", "Catalog cache generation.")).set_function(
+    lambda: catalog_cache.generation
+)
+
+# Event-loop lag sampler; LOOP_BLOCKING_DEBUG also reports the stack of callbacks that hold the loop
+loop_monitor = LoopLagMonitor(
+    interval=float(os.environ.get('LOOP_LAG_INTERVAL', '0.5')),
+    debug=os.environ.get('LOOP_BLOCKING_DEBUG', 'false').lower() == 'true',
+    blocking_threshold=float(os.environ.get('LOOP_BLOCKING_THRESHOLD', '0.1'))
+)
+metrics.REGISTRY.register(metrics.Gauge("event_loop_lag_p50_seconds", "Median event loop lag.")).set_function(
+    lambda: loop_monitor.quantile(0.5)
+)
+metrics.REGISTRY.register(metrics.Gauge("event_loop_lag_p99_seconds", "99th percentile event loop lag.")).set_function(
+    lambda: loop_monitor.quantile(0.99)
+)
+
+# Admin-triggered request profiles (X-Profile: 1) and tracemalloc diffs, see profiling.py
+profile_store = ProfileStore(
+    Path(os.environ.get('PROFILE_DIR', str(Path(tempfile.gettempdir()) / 'profiles'))),
+    keep=int(os.environ.get('PROFILE_KEEP', '200'))
+)
+memory_snapshots = MemorySnapshots()
 
 # Enums
 class OrderStatus(str, Enum):
@@ -95,6 +199,12 @@ class SizeStock(BaseModel):
     size: str
     stock: int
 
+class ImageVariants(BaseModel):
+    src: str  # entry of Product.images
+    width: Optional[int] = None
+    height: Optional[int] = None
+    srcset: Dict[str, str] = {}  # {"webp": "url 160w, ...", "jpeg": "..."}
+
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -104,10 +214,19 @@ class Product(BaseModel):
     price: float
     category: ProductCategory
     images: List[str] = []  # URLs or paths
+    image_variants: List[ImageVariants] = []
     sizes_stock: List[SizeStock] = []
     featured: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ProductPage(BaseModel):
+    products: List[Product]
+    next_cursor: Optional[str] = None
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None
+
 class CartItem(BaseModel):
     model_config = ConfigDict(extra="ignore")
     product_id: str
@@ -164,6 +283,9 @@ class AddToCartRequest(BaseModel):
     size: str
     quantity: int = 1
 
+class UpdateCartItemRequest(BaseModel):
+    quantity: int
+
 class CreateOrderRequest(BaseModel):
     shipping_region_id: str
     customer_name: str
@@ -268,9 +390,10 @@ class SearchProductsRequest(BaseModel):
     category: Optional[str] = None
     min_price: Optional[float] = None
     max_price: Optional[float] = None
-    sort_by: Optional[str] = "created_at"  # created_at, price_asc, price_desc, name
+    sort_by: Optional[str] = "created_at"  # relevance, created_at, price_asc, price_desc, name
     page: int = 1
     limit: int = 20
+    cursor: Optional[str] = None  # keyset mode when set; "" requests the first page
 
 class CheckoutSessionRequest(BaseModel):
     order_id: str
@@ -404,15 +527,24 @@ async def get_current_user(session_token: Optional[str] = Cookie(None), authoriz
     if not token:
         return None
     
+    cached_user = session_cache.get(token)
+    if cached_user:
+        return cached_user
+    
     session = await db.user_sessions.find_one({"session_token": token})
-    if not session or datetime.fromisoformat(session['expires_at']) < datetime.now(timezone.utc):
+    if not session:
+        return None
+    expires_at = as_datetime(session['expires_at'])
+    if expires_at < datetime.now(timezone.utc):
         return None
     
     user_doc = await db.users.find_one({"id": session["user_id"]})
     if not user_doc:
         return None
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    session_cache.set(token, user, expires_at)
+    return user
 
 async def require_auth(session_token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)) -> User:
     user = await get_current_user(session_token, authorization)
@@ -459,7 +591,6 @@ async def get_session_data(response: Response, x_session_id: Optional[str] = Hea
             role=UserRole.customer
         )
         user_dict = user.model_dump()
-        user_dict['created_at'] = user_dict['created_at'].isoformat()
         await db.users.insert_one(user_dict)
     else:
         user = User(**user_doc)
@@ -473,9 +604,6 @@ async def get_session_data(response: Response, x_session_id: Optional[str] = Hea
         expires_at=expires_at
     )
     session_dict = session.model_dump()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
     await db.user_sessions.insert_one(session_dict)
 
     # Set httpOnly cookie for OAuth session
@@ -506,6 +634,7 @@ async def logout(response: Response, user: User = Depends(require_auth), session
         token = authorization.split(" ", 1)[1]
     if token:
         await db.user_sessions.delete_one({"session_token": token})
+        session_cache.invalidate(token)
     response.delete_cookie("session_token")
     return {"message": "Logged out"}
 
@@ -523,7 +652,7 @@ async def admin_login(request: AdminLoginRequest, response: Response) -> Session
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Check if password matches
-    if not bcrypt.checkpw(request.password.encode('utf-8'), stored_password.encode('utf-8') if isinstance(stored_password, str) else stored_password):
+    if not await password_hasher.verify(request.password, stored_password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Create session
@@ -537,8 +666,6 @@ async def admin_login(request: AdminLoginRequest, response: Response) -> Session
         remember_me=request.remember_me
     )
     session_dict = session.model_dump()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
     await db.user_sessions.insert_one(session_dict)
 
     # Set httpOnly cookie
@@ -559,88 +686,400 @@ async def admin_login(request: AdminLoginRequest, response: Response) -> Session
     )
 
 # Product Routes
-@api_router.get("/products", response_model=List[Product])
-async def get_products(category: Optional[str] = None, featured: Optional[bool] = None):
+@api_router.get("/products", response_model=Union[ProductPage, List[Product]])
+async def get_products(
+    category: Optional[str] = None,
+    featured: Optional[bool] = None,
+    sort_by: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
     query = {}
     if category:
         query["category"] = category
     if featured is not None:
         query["featured"] = featured
     
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
-    return products
+    # Keyset pagination when limit/cursor is given, otherwise the legacy full list
+    if limit is not None or cursor is not None:
+        limit = max(1, min(limit or 20, 100))
+        try:
+            return await catalog_cache.get(
+                ("page", category, featured, sort_by, cursor, limit),
+                lambda: fetch_page(db.products, query, sort_by, cursor, limit)
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return await catalog_cache.get(
+        ("list", category, featured),
+        lambda: db.products.find(query, {"_id": 0}).to_list(1000)
+    )
+
+MAX_BATCH_PRODUCTS = 200
+
+async def get_products_by_ids(ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if len(ids) > MAX_BATCH_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_PRODUCTS} ids per request")
+    projection = {"_id": 0}
+    if fields:
+        unknown = set(fields) - set(Product.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection.update({field: 1 for field in fields})
+        projection["id"] = 1
+    
+    async def fetch():
+        products = await db.products.find({"id": {"$in": ids}}, projection).to_list(len(ids))
+        return {product["id"]: product for product in products}
+    
+    return await catalog_cache.get(("batch", tuple(ids), tuple(fields or ())), fetch)
+
+@api_router.get("/products/batch")
+async def get_products_batch(ids: str = "", fields: Optional[str] = None):
+    return await get_products_by_ids(ids.split(","), fields.split(",") if fields else None)
+
+@api_router.post("/products/batch")
+async def post_products_batch(request: ProductBatchRequest):
+    return await get_products_by_ids(request.ids, request.fields)
 
 @api_router.get("/products/{product_id}", response_model=Product)
 async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await catalog_cache.get(
+        ("product", product_id),
+        lambda: db.products.find_one({"id": product_id}, {"_id": 0})
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
 # Cart Routes
 @api_router.get("/cart")
-async def get_cart(user: User = Depends(require_auth)):
+async def get_cart(expand: Optional[str] = None, region_id: Optional[str] = None, user: User = Depends(require_auth)):
+    if expand == "products":
+        return await get_expanded_cart(user.id, region_id)
     cart = await db.carts.find_one({"user_id": user.id}, {"_id": 0})
     if not cart:
         return {"items": []}
     return cart
 
-@api_router.post("/cart/add")
-async def add_to_cart(request: AddToCartRequest, user: User = Depends(require_auth)):
-    # Check product exists and has stock
-    product = await db.products.find_one({"id": request.product_id})
+async def get_expanded_cart(user_id: str, region_id: Optional[str]) -> Dict[str, Any]:
+    """Cart joined to its products (and optional shipping region) in one aggregation."""
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$lookup": {"from": "products", "localField": "items.product_id", "foreignField": "id", "as": "products"}},
+        {"$project": {"_id": 0, "products._id": 0}}
+    ]
+    if region_id:
+        pipeline[2:2] = [
+            {"$addFields": {"region_id": region_id}},
+            {"$lookup": {"from": "shipping_regions", "localField": "region_id", "foreignField": "id", "as": "regions"}}
+        ]
+        pipeline[-1] = {"$project": {"_id": 0, "products._id": 0, "regions._id": 0, "region_id": 0}}
+    result = await db.carts.aggregate(pipeline).to_list(1)
+    if result:
+        cart = result[0]
+        region = (cart.pop("regions", None) or [None])[0]
+    else:
+        cart = {"items": [], "products": []}
+        region = await db.shipping_regions.find_one({"id": region_id}, {"_id": 0}) if region_id else None
+    products_by_id = {product["id"]: product for product in cart.pop("products")}
+    
+    lines = []
+    subtotal = 0
+    for item in cart["items"]:
+        product = products_by_id.get(item["product_id"])
+        size_stock = next((s for s in product["sizes_stock"] if s["size"] == item["size"]), None) if product else None
+        stock = size_stock["stock"] if size_stock else 0
+        available = product is not None and stock >= item["quantity"]
+        line_total = product["price"] * item["quantity"] if product else 0
+        # Subtotal only counts lines that can actually be ordered
+        if available:
+            subtotal += line_total
+        lines.append({
+            **item,
+            "product": product,
+            "unit_price": product["price"] if product else None,
+            "line_total": line_total,
+            "stock": stock,
+            "available": available
+        })
+    
+    shipping_cost = region["cost"] if region else None
+    return {
+        **cart,
+        "lines": lines,
+        "subtotal": subtotal,
+        "shipping_region": region,
+        "shipping_cost": shipping_cost,
+        "total": subtotal + (shipping_cost or 0),
+        "has_unavailable_items": any(not line["available"] for line in lines)
+    }
+
+async def check_size_stock(product_id: str, size: str, quantity: int) -> None:
+    # Only the requested size is projected back
+    product = await db.products.find_one(
+        {"id": product_id},
+        {"_id": 0, "sizes_stock": {"$elemMatch": {"size": size}}}
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    size_stock = next((s for s in product["sizes_stock"] if s["size"] == request.size), None)
-    if not size_stock or size_stock["stock"] < request.quantity:
+    size_stock = (product.get("sizes_stock") or [None])[0]
+    if not size_stock or size_stock["stock"] < quantity:
         raise HTTPException(status_code=400, detail="Insufficient stock")
+
+def cart_line(product_id: str, size: str) -> Dict[str, Any]:
+    return {"product_id": product_id, "size": size}
+
+@api_router.post("/cart/add")
+async def add_to_cart(request: AddToCartRequest, user: User = Depends(require_auth)):
+    # Check product exists and has stock
+    await check_size_stock(request.product_id, request.size, request.quantity)
+    
+    # One bulk_write round trip: make sure the cart exists, then exactly one
+    # of $inc (line present) / $push (line absent) applies
+    line = cart_line(request.product_id, request.size)
+    now = utcnow()
+    ops = [
+        UpdateOne(
+            {"user_id": user.id},
+            {"$setOnInsert": {"id": str(uuid.uuid4()), "items": [], "updated_at": now}},
+            upsert=True
+        ),
+        UpdateOne(
+            {"user_id": user.id, "items": {"$elemMatch": line}},
+            {"$inc": {"items.$.quantity": request.quantity}, "$set": {"updated_at": now}}
+        ),
+        UpdateOne(
+            {"user_id": user.id, "items": {"$not": {"$elemMatch": line}}},
+            {"$push": {"items": {**line, "quantity": request.quantity}}, "$set": {"updated_at": now}}
+        )
+    ]
+    for _ in range(3):
+        try:
+            result = await db.carts.bulk_write(ops, ordered=True)
+        except BulkWriteError as e:
+            # Concurrent first add created the cart (unique user_id); retry
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            continue
+        # Cart ensured + at least one line write. Fewer means a concurrent request
+        # pushed the same line between our $inc and $push filters, so replay. Three
+        # means a concurrent remove landed in between: the $inc hit the old line and
+        # the $push re-created it with our quantity, so we are done.
+        if result.matched_count + result.upserted_count >= 2:
+            break
+    else:
+        raise HTTPException(status_code=409, detail="Cart was modified concurrently, please retry")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": user.id})
-    if not cart:
-        cart = {
-            "id": str(uuid.uuid4()),
-            "user_id": user.id,
-            "items": [],
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.carts.insert_one(cart)
+    return {"message": "Added to cart"}
+
+@api_router.patch("/cart/items/{product_id}/{size}")
+async def update_cart_item(product_id: str, size: str, request: UpdateCartItemRequest, user: User = Depends(require_auth)):
+    if request.quantity <= 0:
+        return await remove_from_cart(product_id, size, user)
     
-    # Check if item exists in cart
-    existing_item = next((item for item in cart["items"] if item["product_id"] == request.product_id and item["size"] == request.size), None)
-    if existing_item:
-        existing_item["quantity"] += request.quantity
-    else:
-        cart["items"].append({
-            "product_id": request.product_id,
-            "size": request.size,
-            "quantity": request.quantity
-        })
+    await check_size_stock(product_id, size, request.quantity)
     
-    cart["updated_at"] = datetime.now(timezone.utc).isoformat()
-    await db.carts.update_one({"user_id": user.id}, {"$set": cart})
+    result = await db.carts.update_one(
+        {"user_id": user.id, "items": {"$elemMatch": cart_line(product_id, size)}},
+        {"$set": {"items.$.quantity": request.quantity, "updated_at": utcnow()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Item not found in cart")
     
-    return {"message": "Added to cart"}
+    return {"message": "Cart updated"}
 
 @api_router.delete("/cart/remove/{product_id}/{size}")
 async def remove_from_cart(product_id: str, size: str, user: User = Depends(require_auth)):
-    cart = await db.carts.find_one({"user_id": user.id})
-    if not cart:
+    result = await db.carts.update_one(
+        {"user_id": user.id},
+        {"$pull": {"items": cart_line(product_id, size)}, "$set": {"updated_at": utcnow()}}
+    )
+    if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    cart["items"] = [item for item in cart["items"] if not (item["product_id"] == product_id and item["size"] == size)]
-    cart["updated_at"] = datetime.now(timezone.utc).isoformat()
-    await db.carts.update_one({"user_id": user.id}, {"$set": cart})
-    
     return {"message": "Removed from cart"}
 
 @api_router.post("/cart/clear")
 async def clear_cart(user: User = Depends(require_auth)):
-    await db.carts.update_one({"user_id": user.id}, {"$set": {"items": [], "updated_at": datetime.now(timezone.utc).isoformat()}})
+    await db.carts.update_one({"user_id": user.id}, {"$set": {"items": [], "updated_at": utcnow()}})
     return {"message": "Cart cleared"}
 
+# Stock reservation
+_transactions_supported: Optional[bool] = None
+
+async def supports_transactions() -> bool:
+    # Multi-document transactions need a replica set or mongos
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+def stock_decrement(product_id: str, size: str, quantity: int) -> tuple:
+    # Matches only while the size still has enough stock, so concurrent
+    # checkouts can never drive it negative
+    return (
+        {"id": product_id, "sizes_stock": {"$elemMatch": {"size": size, "stock": {"$gte": quantity}}}},
+        {"$inc": {"sizes_stock.$.stock": -quantity}}
+    )
+
+async def invalidate_catalog(content: bool = False) -> None:
+    """Bump the catalog generation after a product write; never fails the write itself.
+
+    content=True when searchable fields changed, so other workers rebuild their search index.
+    """
+    try:
+        await catalog_cache.bump(content=content)
+    except Exception:
+        logger.exception("Catalog version bump failed; cached product reads may be stale")
+
+STOCK_TRANSACTION_ATTEMPTS = 5
+
+async def commit_with_retry(session, attempts: int = 3) -> None:
+    # An unknown commit result may still have committed, so only the commit is retried
+    for attempt in range(attempts):
+        try:
+            await session.commit_transaction()
+            return
+        except PyMongoError as exc:
+            if not exc.has_error_label("UnknownTransactionCommitResult") or attempt == attempts - 1:
+                raise
+
+async def reserve_stock(lines: Dict[tuple, int]) -> bool:
+    """Atomically decrement stock for every (product_id, size) -> quantity line.
+
+    Returns False, with nothing decremented, if any line lacks stock.
+    """
+    if await supports_transactions():
+        ops = [UpdateOne(*stock_decrement(product_id, size, quantity)) for (product_id, size), quantity in lines.items()]
+        async with await client.start_session() as session:
+            for attempt in range(STOCK_TRANSACTION_ATTEMPTS):
+                session.start_transaction()
+                try:
+                    result = await db.products.bulk_write(ops, ordered=True, session=session)
+                    if result.modified_count != len(ops):
+                        await session.abort_transaction()
+                        return False
+                except PyMongoError as exc:
+                    await session.abort_transaction()
+                    # Write conflict with a concurrent checkout of the same size: run it again
+                    if exc.has_error_label("TransientTransactionError"):
+                        await asyncio.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+                        continue
+                    raise
+                try:
+                    await commit_with_retry(session)
+                except PyMongoError as exc:
+                    if exc.has_error_label("TransientTransactionError"):
+                        await asyncio.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+                        continue
+                    raise
+                break
+            else:
+                raise HTTPException(status_code=409, detail="Stock is being updated by other orders, please retry")
+        await invalidate_catalog()
+        return True
+    
+    # Standalone server: conditional update per line, compensating on failure
+    reserved = {}
+    for (product_id, size), quantity in lines.items():
+        result = await db.products.update_one(*stock_decrement(product_id, size, quantity))
+        if result.modified_count == 0:
+            await release_stock(reserved)
+            return False
+        reserved[(product_id, size)] = quantity
+    await invalidate_catalog()
+    return True
+
+async def release_stock(lines: Dict[tuple, int]) -> None:
+    if not lines:
+        return
+    ops = [
+        UpdateOne({"id": product_id, "sizes_stock.size": size}, {"$inc": {"sizes_stock.$.stock": quantity}})
+        for (product_id, size), quantity in lines.items()
+    ]
+    await db.products.bulk_write(ops, ordered=False)
+    await invalidate_catalog()
+
+# Sales rollups behind the admin reports
+async def record_sales(order: Dict[str, Any]) -> None:
+    try:
+        await sales_rollup.record_order(db.sales_daily, order)
+    except Exception:
+        logger.exception("Sales rollup update failed for order %s; run scripts/rebuild_sales_rollups.py", order["id"])
+
+async def move_sales(order: Dict[str, Any], old_status: str, new_status: str) -> None:
+    try:
+        await sales_rollup.move_order(db.sales_daily, order, old_status, new_status)
+    except Exception:
+        logger.exception("Sales rollup update failed for order %s; run scripts/rebuild_sales_rollups.py", order["id"])
+
+async def change_order_status(order_id: str, status: str, extra_fields: Optional[Dict[str, Any]] = None) -> bool:
+    """Set an order's status and move its sales rollups between status buckets."""
+    # The pre-image comes from the same atomic write, so status and returned are
+    # exactly what this update replaced even if a return is approved concurrently
+    # (update_return_status flips "returned" the same way)
+    order = await db.orders.find_one_and_update(
+        {"id": order_id},
+        {"$set": {"status": status, "updated_at": utcnow(), **(extra_fields or {})}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not order:
+        return False
+    old_status = sales_rollup.effective_status(order)
+    new_status = sales_rollup.effective_status({**order, "status": status})
+    await move_sales(order, old_status, new_status)
+    return True
+
 # Order Routes
+def whatsapp_order_notification(order: Order) -> Optional[Dict[str, Any]]:
+    # WhatsApp notification (optional), delivered by the outbox worker
+    if os.environ.get('WHATSAPP_ENABLED', 'false').lower() != 'true' or not order.customer_phone:
+        return None
+    if not (os.environ.get('WHATSAPP_TOKEN') and os.environ.get('WHATSAPP_PHONE_NUMBER_ID')):
+        logging.getLogger(__name__).warning("WhatsApp env vars missing; skip notify")
+        return None
+    total = order.total_amount + order.shipping_cost
+    body = (
+        f"Merhaba {order.customer_name}, siparişiniz alındı.\\n"
+        f"Sipariş No: {order.id}\\n"
+        f"Toplam: {total:.2f}₺\\n"
+        f"Kargo Bölgesi: {order.shipping_region}\\n"
+        f"Adres: {order.shipping_address}\\n"
+        f"Durum: {order.status}"
+    )
+    return {"order_id": order.id, "to": order.customer_phone, "body": body}
+
+async def insert_order(order_dict: Dict[str, Any], notification: Optional[Dict[str, Any]]) -> None:
+    """Insert the order and its outbox job.
+
+    On a replica set both go in one transaction, so the notification is
+    recorded if and only if the order is. A standalone server has no
+    transactions: the job is a separate insert after the order, and a crash
+    in between loses the notification (never the order).
+    """
+    if notification and await supports_transactions():
+        async def write(session):
+            await db.orders.insert_one(order_dict, session=session)
+            await enqueue_outbox(db.outbox, "whatsapp", notification, session=session)
+        async with await client.start_session() as session:
+            await session.with_transaction(write)
+        return
+    await db.orders.insert_one(order_dict)
+    if notification:
+        try:
+            await enqueue_outbox(db.outbox, "whatsapp", notification)
+        except Exception as e:
+            logging.getLogger(__name__).exception("WhatsApp notify enqueue failed: %s", e)
+
 @api_router.post("/orders")
 async def create_order(request: CreateOrderRequest, user: User = Depends(require_auth)):
     # Get cart
@@ -653,16 +1092,22 @@ async def create_order(request: CreateOrderRequest, user: User = Depends(require
     if not region:
         raise HTTPException(status_code=404, detail="Shipping region not found")
     
+    # Fetch all cart products in one query
+    product_ids = list({item["product_id"] for item in cart["items"]})
+    products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0}).to_list(len(product_ids))
+    products_by_id = {product["id"]: product for product in products}
+    
     # Calculate order
     order_items = []
     total_amount = 0
+    stock_lines = {}
     
     for cart_item in cart["items"]:
-        product = await db.products.find_one({"id": cart_item["product_id"]})
+        product = products_by_id.get(cart_item["product_id"])
         if not product:
             continue
         
-        # Check stock
+        # Early stock check for a friendly error; reserve_stock is authoritative
         size_stock = next((s for s in product["sizes_stock"] if s["size"] == cart_item["size"]), None)
         if not size_stock or size_stock["stock"] < cart_item["quantity"]:
             raise HTTPException(status_code=400, detail=f"Insufficient stock for {product['name']['en']}")
@@ -675,12 +1120,12 @@ async def create_order(request: CreateOrderRequest, user: User = Depends(require
             price=product["price"]
         ))
         total_amount += product["price"] * cart_item["quantity"]
-        
-        # Update stock
-        for size_s in product["sizes_stock"]:
-            if size_s["size"] == cart_item["size"]:
-                size_s["stock"] -= cart_item["quantity"]
-        await db.products.update_one({"id": product["id"]}, {"$set": {"sizes_stock": product["sizes_stock"]}})
+        line = (product["id"], cart_item["size"])
+        stock_lines[line] = stock_lines.get(line, 0) + cart_item["quantity"]
+    
+    # Update stock
+    if not await reserve_stock(stock_lines):
+        raise HTTPException(status_code=400, detail="Insufficient stock for one or more items")
     
     # Create order
     order = Order(
@@ -699,40 +1144,16 @@ async def create_order(request: CreateOrderRequest, user: User = Depends(require
     )
     
     order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    order_dict['updated_at'] = order_dict['updated_at'].isoformat()
-    await db.orders.insert_one(order_dict)
-
-    # WhatsApp notification (optional)
+    notification = whatsapp_order_notification(order)
     try:
-        if os.environ.get('WHATSAPP_ENABLED', 'false').lower() == 'true' and order.customer_phone:
-            token = os.environ.get('WHATSAPP_TOKEN')
-            phone_id = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')
-            if token and phone_id:
-                url = f"https://graph.facebook.com/v17.0/{phone_id}/messages"
-                headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-                total = order.total_amount + order.shipping_cost
-                body = (
-                    f"Merhaba {order.customer_name}, siparişiniz alındı.\\n"
-                    f"Sipariş No: {order.id}\\n"
-                    f"Toplam: {total:.2f}₺\\n"
-                    f"Kargo Bölgesi: {order.shipping_region}\\n"
-                    f"Adres: {order.shipping_address}\\n"
-                    f"Durum: {order.status}"
-                )
-                payload = {
-                    "messaging_product": "whatsapp",
-                    "to": order.customer_phone,
-                    "type": "text",
-                    "text": {"preview_url": False, "body": body}
-                }
-                resp = requests.post(url, headers=headers, json=payload, timeout=10)
-                logging.getLogger(__name__).info("WhatsApp send status %s: %s", resp.status_code, resp.text)
-            else:
-                logging.getLogger(__name__).warning("WhatsApp env vars missing; skip notify")
-    except Exception as e:
-        logging.getLogger(__name__).exception("WhatsApp notify failed: %s", e)
-    
+        await insert_order(order_dict, notification)
+    except Exception:
+        await release_stock(stock_lines)
+        raise
+    if notification:
+        outbox_worker.notify()
+    await record_sales(order_dict)
+
     # Clear cart
     await db.carts.update_one({"user_id": user.id}, {"$set": {"items": []}})
     
@@ -785,8 +1206,9 @@ async def create_product(request: ProductCreateRequest, user: User = Depends(req
     )
     
     product_dict = product.model_dump()
-    product_dict['created_at'] = product_dict['created_at'].isoformat()
     await db.products.insert_one(product_dict)
+    await invalidate_catalog(content=True)
+    product_search.add(product_dict)
     
     return product
 
@@ -815,6 +1237,8 @@ async def update_product(product_id: str, request: ProductCreateRequest, user: U
     }
     
     await db.products.update_one({"id": product_id}, {"$set": update_data})
+    await invalidate_catalog(content=True)
+    product_search.add({**product, **update_data})
     return {"message": "Product updated"}
 
 @api_router.delete("/admin/products/{product_id}")
@@ -822,6 +1246,8 @@ async def delete_product(product_id: str, user: User = Depends(require_admin)):
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    product_search.remove(product_id)
+    await invalidate_catalog(content=True)
     return {"message": "Product deleted"}
 
 @api_router.post("/admin/products/{product_id}/images")
@@ -830,21 +1256,49 @@ async def upload_product_image(product_id: str, file: UploadFile = File(...), us
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Save file
-    file_ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}"
-    file_path = UPLOAD_FOLDER / filename
-    
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
-    
-    # Update product
-    image_url = f"/uploads/{filename}"
-    product["images"].append(image_url)
-    await db.products.update_one({"id": product_id}, {"$set": {"images": product["images"]}})
-    
-    return {"message": "Image uploaded", "url": image_url}
+    # Stream to a per-request staging directory under its content hash; concurrent
+    # uploads of the same image must not share (and race on) staged files
+    staging = Path(tempfile.mkdtemp(dir=storage.staging_dir))
+    try:
+        try:
+            stored = await store_upload(file, staging, MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UnsupportedImageType as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        
+        key = stored["filename"]
+        image_url = storage.url(key)
+        update = {"images": image_url}
+        
+        # Same image uploaded before: reuse the stored object and its derivatives
+        known = await db.products.find_one(
+            {"image_variants.src": image_url},
+            {"_id": 0, "image_variants": {"$elemMatch": {"src": image_url}}}
+        )
+        deduplicated = bool(known) and await storage.exists(key)
+        if deduplicated:
+            update["image_variants"] = known["image_variants"][0]
+        else:
+            files = [(key, stored["content_type"])]
+            try:
+                rendered = await image_pool.render(staging / key)
+                update["image_variants"] = build_entry(image_url, storage.url, rendered)
+                files += [(v["file"], content_type_for(v["file"])) for v in rendered["variants"]]
+            except Exception:
+                # Keep the original; scripts/backfill_image_derivatives.py can retry
+                logger.exception("Rendering derivatives of %s failed", image_url)
+            await asyncio.gather(*(
+                storage.put(name, staging / name, content_type) for name, content_type in files
+            ))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    
+    # Update product; $addToSet keeps a re-uploaded image from being listed twice
+    await db.products.update_one({"id": product_id}, {"$addToSet": update})
+    await invalidate_catalog()
+    
+    return {"message": "Image uploaded", "url": image_url, "sha256": stored["sha256"], "deduplicated": deduplicated}
 
 @api_router.get("/admin/orders", response_model=List[Order])
 async def get_all_orders(user: User = Depends(require_admin)):
@@ -853,55 +1307,102 @@ async def get_all_orders(user: User = Depends(require_admin)):
 
 @api_router.patch("/admin/orders/{order_id}/status")
 async def update_order_status(order_id: str, request: UpdateOrderStatusRequest, user: User = Depends(require_admin)):
-    order = await db.orders.find_one({"id": order_id})
-    if not order:
+    if not await change_order_status(order_id, request.status.value):
         raise HTTPException(status_code=404, detail="Order not found")
     
-    await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": request.status.value, "updated_at": datetime.now(timezone.utc).isoformat()}}
-    )
-    
     # TODO: Send notification (mocked for now)
     
     return {"message": "Order status updated"}
 
+class ReportFilters:
+    """Common ?from=&to=&granularity=&status= parameters of the sales reports."""
+    def __init__(
+        self,
+        from_: Optional[str] = Query(None, alias="from"),
+        to: Optional[str] = None,
+        granularity: Optional[str] = None,
+        status: Optional[str] = None
+    ):
+        try:
+            self.start = datetime.fromisoformat(from_) if from_ else None
+            self.end = datetime.fromisoformat(to) if to else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="from/to must be ISO dates")
+        if granularity and granularity not in sales_rollup.GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(sales_rollup.GRANULARITIES)}")
+        self.granularity = granularity or "day"
+        self.statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+        # No filters: keep the original bare-list response
+        self.legacy = not (from_ or to or granularity or status)
+    
+    def match(self, product_rows: bool) -> Dict[str, Any]:
+        return sales_rollup.report_match(product_rows, self.start, self.end, self.statuses)
+
+async def run_report(filters: ReportFilters, product_rows: bool, items: List[Dict[str, Any]],
+                     series_group: Dict[str, Any], series_fields: List[str]) -> Any:
+    # Everything reads sales_daily; the leading $match is a day-range index seek
+    match = {"$match": filters.match(product_rows)}
+    if filters.legacy:
+        return await db.sales_daily.aggregate([match] + items).to_list(None)
+    
+    group_id = {"period": sales_rollup.period_expr(filters.granularity), **series_group}
+    series = [
+        {"$group": {"_id": group_id, **{field: {"$sum": f"${field}"} for field in series_fields}}},
+        {"$sort": {"_id.period": 1}},
+        {"$project": {"_id": 0, **{key: f"$_id.{key}" for key in group_id}, **{field: 1 for field in series_fields}}}
+    ]
+    result = await db.sales_daily.aggregate([match, {"$facet": {"items": items, "series": series}}]).to_list(1)
+    return {
+        "from": filters.start,
+        "to": filters.end,
+        "granularity": filters.granularity,
+        "statuses": filters.statuses,
+        "items": result[0]["items"] if result else [],
+        "series": result[0]["series"] if result else []
+    }
+
 @api_router.get("/admin/reports/best-selling")
-async def get_best_selling_products(user: User = Depends(require_admin)):
-    # Aggregate orders to find best-selling products
-    pipeline = [
-        {"$unwind": "$items"},
+async def get_best_selling_products(filters: ReportFilters = Depends(), user: User = Depends(require_admin)):
+    # Read from the sales_daily rollups; cancelled/returned sales are excluded by default
+    items = [
         {
             "$group": {
-                "_id": "$items.product_id",
-                "product_name": {"$first": "$items.product_name"},
-                "total_quantity": {"$sum": "$items.quantity"},
-                "total_revenue": {"$sum": {"$multiply": ["$items.quantity", "$items.price"]}}
+                "_id": "$product_id",
+                "product_name": {"$last": "$product_name"},
+                "total_quantity": {"$sum": "$quantity"},
+                "total_revenue": {"$sum": "$revenue"}
             }
         },
+        {"$match": {"total_quantity": {"$gt": 0}}},
         {"$sort": {"total_quantity": -1}},
         {"$limit": 10}
     ]
-    
-    results = await db.orders.aggregate(pipeline).to_list(10)
-    return results
+    return await run_report(filters, True, items, {}, ["quantity", "revenue"])
 
 @api_router.get("/admin/reports/regions")
-async def get_active_regions(user: User = Depends(require_admin)):
-    # Aggregate orders by shipping region
-    pipeline = [
+async def get_active_regions(filters: ReportFilters = Depends(), user: User = Depends(require_admin)):
+    # Order-level rollup rows (product_id null) per shipping region
+    items = [
         {
             "$group": {
-                "_id": "$shipping_region",
-                "total_orders": {"$sum": 1},
-                "total_revenue": {"$sum": "$total_amount"}
+                "_id": "$region",
+                "total_orders": {"$sum": "$orders"},
+                "total_revenue": {"$sum": "$revenue"}
             }
         },
+        {"$match": {"total_orders": {"$gt": 0}}},
         {"$sort": {"total_orders": -1}}
     ]
-    
-    results = await db.orders.aggregate(pipeline).to_list(100)
-    return results
+    return await run_report(filters, False, items, {"region": "$region"}, ["orders", "revenue"])
+
+@api_router.get("/admin/reports/revenue")
+async def get_revenue_report(filters: ReportFilters = Depends(), user: User = Depends(require_admin)):
+    filters.legacy = False
+    items = [
+        {"$group": {"_id": None, "total_orders": {"$sum": "$orders"}, "total_revenue": {"$sum": "$revenue"}}},
+        {"$project": {"_id": 0}}
+    ]
+    return await run_report(filters, False, items, {}, ["orders", "revenue"])
 
 # ===== NEW FEATURES API ENDPOINTS =====
 
@@ -933,7 +1434,6 @@ async def add_address(request: AddAddressRequest, user: User = Depends(require_a
         **request.model_dump()
     )
     address_dict = address.model_dump()
-    address_dict['created_at'] = address_dict['created_at'].isoformat()
     await db.user_addresses.insert_one(address_dict)
     return address
 
@@ -977,17 +1477,18 @@ async def change_password(request: ChangePasswordRequest, user: User = Depends(r
     
     # Verify old password
     stored_password = user_doc.get("password")
-    if not bcrypt.checkpw(request.old_password.encode('utf-8'), stored_password.encode('utf-8') if isinstance(stored_password, str) else stored_password):
+    if not await password_hasher.verify(request.old_password, stored_password):
         raise HTTPException(status_code=401, detail="Current password is incorrect")
     
     # Hash new password
-    new_password_hash = bcrypt.hashpw(request.new_password.encode('utf-8'), bcrypt.gensalt())
+    new_password_hash = await password_hasher.hash(request.new_password)
     
     # Update password
     await db.users.update_one(
         {"id": user.id},
-        {"$set": {"password": new_password_hash.decode('utf-8')}}
+        {"$set": {"password": new_password_hash}}
     )
+    session_cache.invalidate_user(user.id)
     
     return {"message": "Password changed successfully"}
 
@@ -1010,8 +1511,6 @@ async def request_password_reset(request: ResetPasswordRequest):
         expires_at=expires_at
     )
     token_dict = token_data.model_dump()
-    token_dict['expires_at'] = token_dict['expires_at'].isoformat()
-    token_dict['created_at'] = token_dict['created_at'].isoformat()
     await db.password_reset_tokens.insert_one(token_dict)
     
     # TODO: Send email with reset link
@@ -1032,18 +1531,19 @@ async def confirm_password_reset(request: ConfirmPasswordResetRequest):
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
     
     # Check expiration
-    expires_at = datetime.fromisoformat(token_doc['expires_at'])
+    expires_at = as_datetime(token_doc['expires_at'])
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Reset token has expired")
     
     # Hash new password
-    new_password_hash = bcrypt.hashpw(request.new_password.encode('utf-8'), bcrypt.gensalt())
+    new_password_hash = await password_hasher.hash(request.new_password)
     
     # Update password
     await db.users.update_one(
         {"id": token_doc["user_id"]},
-        {"$set": {"password": new_password_hash.decode('utf-8')}}
+        {"$set": {"password": new_password_hash}}
     )
+    session_cache.invalidate_user(token_doc["user_id"])
     
     # Mark token as used
     await db.password_reset_tokens.update_one(
@@ -1060,8 +1560,25 @@ async def search_products(request: SearchProductsRequest):
     query = {}
     
     # Text search
-    if request.query:
-        # Search in product names across all languages
+    if request.query and product_search.ready:
+        matches = product_search.search(request.query, request.category, request.min_price, request.max_price)
+        # BM25 order unless an explicit sort was requested
+        if (request.sort_by == "relevance" or "sort_by" not in request.model_fields_set) and request.cursor is None:
+            skip = (request.page - 1) * request.limit
+            page_ids = [product_id for product_id, _ in matches[skip:skip + request.limit]]
+            docs = await db.products.find({"id": {"$in": page_ids}}, {"_id": 0}).to_list(len(page_ids))
+            docs_by_id = {doc["id"]: doc for doc in docs}
+            total = len(matches)
+            return {
+                "products": [docs_by_id[product_id] for product_id in page_ids if product_id in docs_by_id],
+                "total": total,
+                "page": request.page,
+                "limit": request.limit,
+                "total_pages": (total + request.limit - 1) // request.limit
+            }
+        query["id"] = {"$in": [product_id for product_id, _ in matches]}
+    elif request.query:
+        # Index not built yet: search in product names across all languages
         query["$or"] = [
             {"name.en": {"$regex": request.query, "$options": "i"}},
             {"name.ar": {"$regex": request.query, "$options": "i"}},
@@ -1081,14 +1598,17 @@ async def search_products(request: SearchProductsRequest):
         if request.max_price is not None:
             query["price"]["$lte"] = request.max_price
     
+    # Keyset pagination: no count, no skip
+    if request.cursor is not None:
+        limit = max(1, min(request.limit, 100))
+        try:
+            page = await fetch_page(db.products, query, request.sort_by, request.cursor, limit)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {**page, "limit": limit}
+    
     # Sorting
-    sort_options = {
-        "created_at": ("created_at", -1),
-        "price_asc": ("price", 1),
-        "price_desc": ("price", -1),
-        "name": ("name.en", 1)
-    }
-    sort_field, sort_order = sort_options.get(request.sort_by, ("created_at", -1))
+    sort_field, sort_order = SORT_OPTIONS.get(request.sort_by, ("created_at", -1))
     
     # Pagination
     skip = (request.page - 1) * request.limit
@@ -1170,8 +1690,6 @@ async def create_checkout_session(request: CheckoutSessionRequest, user: User =
             metadata=checkout_request.metadata
         )
         payment_dict = payment.model_dump()
-        payment_dict['created_at'] = payment_dict['created_at'].isoformat()
-        payment_dict['updated_at'] = payment_dict['updated_at'].isoformat()
         await db.payment_transactions.insert_one(payment_dict)
         
         return {"url": session.url, "session_id": session.session_id}
@@ -1205,18 +1723,15 @@ async def get_checkout_status(session_id: str, user: User = Depends(require_auth
                 {"$set": {
                     "payment_status": PaymentStatus.completed,
                     "stripe_payment_intent": status.payment_status,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
+                    "updated_at": utcnow()
                 }}
             )
             
             # Update order
-            await db.orders.update_one(
-                {"id": payment["order_id"]},
-                {"$set": {
-                    "payment_method": "stripe",
-                    "payment_status": "paid",
-                    "status": OrderStatus.processing
-                }}
+            await change_order_status(
+                payment["order_id"],
+                OrderStatus.processing.value,
+                {"payment_method": "stripe", "payment_status": "paid"}
             )
             
             # TODO: Send order confirmation email
@@ -1258,19 +1773,16 @@ async def stripe_webhook(request: Request):
                     {"session_id": session_id},
                     {"$set": {
                         "payment_status": PaymentStatus.completed,
-                        "updated_at": datetime.now(timezone.utc).isoformat()
+                        "updated_at": utcnow()
                     }}
                 )
                 
                 # Update order
                 if payment.get("order_id"):
-                    await db.orders.update_one(
-                        {"id": payment["order_id"]},
-                        {"$set": {
-                            "payment_method": "stripe",
-                            "payment_status": "paid",
-                            "status": OrderStatus.processing
-                        }}
+                    await change_order_status(
+                        payment["order_id"],
+                        OrderStatus.processing.value,
+                        {"payment_method": "stripe", "payment_status": "paid"}
                     )
         
         return {"status": "success"}
@@ -1288,18 +1800,17 @@ async def register_user(request: RegisterRequest):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    password_hash = bcrypt.hashpw(request.password.encode('utf-8'), bcrypt.gensalt())
+    password_hash = await password_hasher.hash(request.password)
     
     # Create user
     user = User(
         id=str(uuid.uuid4()),
         email=request.email,
         name=request.name,
-        password=password_hash.decode('utf-8'),
+        password=password_hash,
         role=UserRole.customer
     )
     user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     await db.users.insert_one(user_dict)
     
     # Create session
@@ -1311,8 +1822,6 @@ async def register_user(request: RegisterRequest):
         expires_at=expires_at
     )
     session_dict = session.model_dump()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
     await db.user_sessions.insert_one(session_dict)
     
     return SessionDataResponse(
@@ -1332,7 +1841,7 @@ async def login_user(request: LoginRequest, response: Response):
     
     # Verify password
     stored_password = user_doc.get("password")
-    if not bcrypt.checkpw(request.password.encode('utf-8'), stored_password.encode('utf-8') if isinstance(stored_password, str) else stored_password):
+    if not await password_hasher.verify(request.password, stored_password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     user = User(**user_doc)
@@ -1348,8 +1857,6 @@ async def login_user(request: LoginRequest, response: Response):
         remember_me=request.remember_me
     )
     session_dict = session.model_dump()
-    session_dict['expires_at'] = session_dict['expires_at'].isoformat()
-    session_dict['created_at'] = session_dict['created_at'].isoformat()
     await db.user_sessions.insert_one(session_dict)
 
     # Set httpOnly cookie
@@ -1395,7 +1902,6 @@ async def add_review(request: AddReviewRequest, user: User = Depends(require_aut
         comment=request.comment
     )
     review_dict = review.model_dump()
-    review_dict['created_at'] = review_dict['created_at'].isoformat()
     await db.product_reviews.insert_one(review_dict)
     
     return review
@@ -1441,7 +1947,6 @@ async def add_to_wishlist(product_id: str, user: User = Depends(require_auth)):
         product_id=product_id
     )
     item_dict = item.model_dump()
-    item_dict['created_at'] = item_dict['created_at'].isoformat()
     await db.wishlist.insert_one(item_dict)
     
     return {"message": "Added to wishlist"}
@@ -1465,16 +1970,7 @@ async def apply_coupon(request: ApplyCouponRequest, user: User = Depends(require
     
     # Check expiration
     if coupon.expires_at:
-        if isinstance(coupon.expires_at, datetime):
-            expires_at = coupon.expires_at
-        else:
-            expires_at = datetime.fromisoformat(coupon.expires_at)
-        
-        # Ensure both datetimes are timezone-aware for comparison
-        if expires_at.tzinfo is None:
-            expires_at = expires_at.replace(tzinfo=timezone.utc)
-        
-        if expires_at < datetime.now(timezone.utc):
+        if as_datetime(coupon.expires_at) < datetime.now(timezone.utc):
             raise HTTPException(status_code=400, detail="Coupon has expired")
     
     # Check usage limit
@@ -1497,13 +1993,10 @@ async def create_coupon(request: CreateCouponRequest, user: User = Depends(requi
         value=request.value,
         min_purchase=request.min_purchase,
         max_discount=request.max_discount,
-        expires_at=datetime.fromisoformat(request.expires_at) if request.expires_at else None,
+        expires_at=as_datetime(request.expires_at),
         usage_limit=request.usage_limit
     )
     coupon_dict = coupon.model_dump()
-    if coupon_dict.get('expires_at'):
-        coupon_dict['expires_at'] = coupon_dict['expires_at'].isoformat()
-    coupon_dict['created_at'] = coupon_dict['created_at'].isoformat()
     await db.coupons.insert_one(coupon_dict)
     
     return coupon
@@ -1528,13 +2021,10 @@ async def update_shipping_tracking(order_id: str, request: UpdateTrackingRequest
         tracking_number=request.tracking_number,
         carrier=request.carrier,
         status=request.status,
-        estimated_delivery=datetime.fromisoformat(request.estimated_delivery) if request.estimated_delivery else None
+        estimated_delivery=as_datetime(request.estimated_delivery)
     )
     
     tracking_dict = tracking.model_dump()
-    if tracking_dict.get('estimated_delivery'):
-        tracking_dict['estimated_delivery'] = tracking_dict['estimated_delivery'].isoformat()
-    tracking_dict['updated_at'] = tracking_dict['updated_at'].isoformat()
     
     # Upsert tracking info
     await db.shipping_tracking.update_one(
@@ -1579,8 +2069,6 @@ async def request_return(request: RequestReturnRequest, user: User = Depends(req
         refund_amount=order["total_amount"] + order["shipping_cost"]
     )
     return_dict = order_return.model_dump()
-    return_dict['created_at'] = return_dict['created_at'].isoformat()
-    return_dict['updated_at'] = return_dict['updated_at'].isoformat()
     await db.order_returns.insert_one(return_dict)
     
     return {"message": "Return request submitted", "return_id": order_return.id}
@@ -1592,12 +2080,29 @@ async def get_all_returns(user: User = Depends(require_admin)):
 
 @api_router.patch("/admin/returns/{return_id}/status")
 async def update_return_status(return_id: str, status: str, user: User = Depends(require_admin)):
-    result = await db.order_returns.update_one(
-        {"id": return_id},
-        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    previous = await db.order_returns.find_one_and_update(
+        {"id": return_id, "status": {"$ne": status}},
+        {"$set": {"status": status, "updated_at": utcnow()}},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count == 0:
+    if not previous:
         raise HTTPException(status_code=404, detail="Return request not found")
+    
+    # Approved/completed returns move the order into the "returned" sales bucket
+    returned = status in sales_rollup.RETURN_COUNTED_STATUSES
+    if returned != (previous["status"] in sales_rollup.RETURN_COUNTED_STATUSES):
+        order = await db.orders.find_one_and_update(
+            {"id": previous["order_id"]},
+            {"$set": {"returned": returned}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if order:
+            await move_sales(
+                order,
+                sales_rollup.effective_status(order),
+                sales_rollup.effective_status({**order, "returned": returned})
+            )
     return {"message": "Return status updated"}
 
 # 12. CONTACT FORM
@@ -1611,7 +2116,6 @@ async def submit_contact_form(request: ContactFormRequest):
         message=request.message
     )
     message_dict = message.model_dump()
-    message_dict['created_at'] = message_dict['created_at'].isoformat()
     await db.contact_messages.insert_one(message_dict)
     
     return {"message": "Message sent successfully"}
@@ -1632,52 +2136,138 @@ async def update_contact_status(message_id: str, status: str, user: User = Depen
     return {"message": "Status updated"}
 
 # 13. ADMIN ANALYTICS
-@api_router.get("/admin/analytics/dashboard")
-async def get_dashboard_analytics(user: User = Depends(require_admin)):
-    # Total orders
-    total_orders = await db.orders.count_documents({})
-    
-    # Total revenue
+LOW_STOCK_THRESHOLD = 5
+dashboard_cache = SingleFlightCache(ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', '10')))
+
+async def compute_dashboard_analytics() -> Dict[str, Any]:
     revenue_pipeline = [
         {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
     ]
-    revenue_result = await db.orders.aggregate(revenue_pipeline).to_list(1)
-    total_revenue = revenue_result[0]["total"] if revenue_result else 0
-    
-    # Total customers
-    total_customers = await db.users.count_documents({"role": "customer"})
-    
-    # Pending orders
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    
-    # Low stock products
-    all_products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    low_stock = []
-    for product in all_products:
-        for size_stock in product.get("sizes_stock", []):
-            if size_stock["stock"] < 5:
-                low_stock.append({
-                    "product_id": product["id"],
-                    "product_name": product["name"]["en"],
-                    "size": size_stock["size"],
-                    "stock": size_stock["stock"]
-                })
-    
-    # Recent orders
-    recent_orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    # Only sizes below the threshold leave the server
+    low_stock_pipeline = [
+        {"$match": {"sizes_stock.stock": {"$lt": LOW_STOCK_THRESHOLD}}},
+        {"$unwind": "$sizes_stock"},
+        {"$match": {"sizes_stock.stock": {"$lt": LOW_STOCK_THRESHOLD}}},
+        {"$project": {
+            "_id": 0,
+            "product_id": "$id",
+            "product_name": "$name.en",
+            "size": "$sizes_stock.size",
+            "stock": "$sizes_stock.stock"
+        }}
+    ]
+    
+    # Independent queries run concurrently
+    total_orders, revenue_result, total_customers, pending_orders, low_stock, recent_orders = await asyncio.gather(
+        db.orders.count_documents({}),
+        db.orders.aggregate(revenue_pipeline).to_list(1),
+        db.users.count_documents({"role": "customer"}),
+        db.orders.count_documents({"status": "pending"}),
+        db.products.aggregate(low_stock_pipeline).to_list(None),
+        db.orders.find({}, {"_id": 0}).sort("created_at", -1).limit(5).to_list(5)
+    )
     
     return {
         "total_orders": total_orders,
-        "total_revenue": total_revenue,
+        "total_revenue": revenue_result[0]["total"] if revenue_result else 0,
         "total_customers": total_customers,
         "pending_orders": pending_orders,
         "low_stock_products": low_stock,
         "recent_orders": recent_orders
     }
 
+@api_router.get("/admin/analytics/dashboard")
+async def get_dashboard_analytics(user: User = Depends(require_admin)):
+    # Cached for a few seconds; concurrent refreshes share one computation
+    return await dashboard_cache.get("dashboard", compute_dashboard_analytics)
+
+@api_router.get("/admin/session-cache/stats")
+async def get_session_cache_stats(user: User = Depends(require_admin)):
+    return session_cache.stats()
+
+@api_router.get("/admin/catalog-cache/stats")
+async def get_catalog_cache_stats(user: User = Depends(require_admin)):
+    return catalog_cache.stats()
+
+@api_router.get("/admin/sessions/stats")
+async def get_session_stats(user: User = Depends(require_admin)):
+    # Served by the expires_at TTL index
+    live_sessions = await db.user_sessions.count_documents({"expires_at": {"$gt": datetime.now(timezone.utc)}})
+    return {"live_sessions": live_sessions, "legacy_sweeper": expiry_sweeper.stats()}
+
+@api_router.get("/admin/outbox/stats")
+async def get_outbox_stats(user: User = Depends(require_admin)):
+    pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    counts = await db.outbox.aggregate(pipeline).to_list(10)
+    return {
+        "jobs": {c["_id"]: c["count"] for c in counts},
+        "worker": outbox_worker.stats()
+    }
+
+@api_router.get("/admin/password-hasher/stats")
+async def get_password_hasher_stats(user: User = Depends(require_admin)):
+    return password_hasher.stats()
+
+@api_router.get("/admin/event-loop/stats")
+async def get_event_loop_stats(user: User = Depends(require_admin)):
+    return loop_monitor.stats()
+
+@api_router.get("/admin/profiles")
+async def list_profiles(user: User = Depends(require_admin)):
+    return await asyncio.to_thread(profile_store.list)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, user: User = Depends(require_admin)):
+    folded = await asyncio.to_thread(profile_store.read, profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(folded, headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'})
+
+@api_router.get("/admin/memory")
+async def get_memory_status(user: User = Depends(require_admin)):
+    return memory_snapshots.status()
+
+@api_router.post("/admin/memory/snapshot")
+async def take_memory_snapshot(frames: int = Query(1, ge=1, le=50), user: User = Depends(require_admin)):
+    # Starts tracemalloc on first use; the next /diff compares against this snapshot
+    return await asyncio.to_thread(memory_snapshots.snapshot, frames)
+
+@api_router.get("/admin/memory/diff")
+async def get_memory_diff(
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    user: User = Depends(require_admin)
+):
+    try:
+        top = await asyncio.to_thread(memory_snapshots.diff, limit, group_by)
+    except ValueError:
+        raise HTTPException(status_code=409, detail="Take a snapshot first")
+    return {**memory_snapshots.status(), "top": top}
+
+@api_router.delete("/admin/memory/snapshot")
+async def stop_memory_tracing(user: User = Depends(require_admin)):
+    return memory_snapshots.stop()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        LIVE_SESSIONS.set(await db.user_sessions.count_documents({"expires_at": {"$gt": datetime.now(timezone.utc)}}))
+    except Exception:
+        logger.exception("Live session count failed")
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Local uploads are served by the app; S3 objects come straight from the bucket/CDN
+if isinstance(storage, LocalStorage):
+    app.mount("/uploads", UploadFiles(UPLOAD_FOLDER), name="uploads")
+
+# Refuse oversized uploads before Starlette spools the multipart body to disk;
+# added before CORS so its 413 still carries the CORS headers
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1685,6 +2275,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+async def authorize_profiling(request: Request):
+    await require_admin(request.cookies.get("session_token"), request.headers.get("authorization"))
+
+app.add_middleware(
+    ProfilingMiddleware,
+    authorize=authorize_profiling,
+    store=profile_store,
+    interval=float(os.environ.get('PROFILE_INTERVAL', '0.001'))
+)
+# Mongo calls per request: warn over budget or on repeated query shapes (N+1)
+app.add_middleware(
+    QueryBudgetMiddleware,
+    max_calls=int(os.environ.get('DB_CALL_BUDGET', '20')),
+    repeat_threshold=int(os.environ.get('DB_REPEAT_THRESHOLD', '5')),
+    debug_headers=os.environ.get('DB_DEBUG_HEADERS', 'false').lower() == 'true'
+)
+# Outermost, so latency includes CORS and error handling
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many login attempts in progress, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
 
 # Configure logging
 logging.basicConfig(
@@ -1693,6 +2309,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db)
+
+async def refresh_search_index():
+    while True:
+        try:
+            # Tokenizing the catalog runs in a thread; the new index is swapped in when done
+            await product_search.rebuild(lambda: db.products.find({}, SEARCH_INDEX_PROJECTION).to_list(None))
+        except Exception:
+            logger.exception("Search index rebuild failed")
+        try:
+            await asyncio.wait_for(search_index_stale.wait(), timeout=SEARCH_INDEX_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        search_index_stale.clear()
+
+@app.on_event("startup")
+async def start_search_index():
+    app.state.search_index_task = asyncio.create_task(refresh_search_index())
+
+@app.on_event("startup")
+async def start_outbox_worker():
+    outbox_worker.start()
+
+@app.on_event("startup")
+async def start_expiry_sweeper():
+    expiry_sweeper.start()
+
+@app.on_event("startup")
+async def start_catalog_version_poll():
+    catalog_cache.start()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await outbox_worker.stop()
+    await expiry_sweeper.stop()
+    await catalog_cache.stop()
+    await loop_monitor.stop()
+    app.state.search_index_task.cancel()
     client.close()
+    password_hasher.shutdown()
+    image_pool.shutdown()
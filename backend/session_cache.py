@@ -0,0 +1,61 @@
+"""
+In-process cache of session token -> resolved user.
+
+Every authenticated request used to cost two Mongo round trips (session
+lookup + user lookup). Entries expire at the earlier of the configured TTL
+and the session's own expires_at, so an expired session is never served.
+The cache is per-process: keep the TTL short so a logout handled by another
+worker is picked up quickly.
+"""
+import time
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from cachetools import TLRUCache
+
+
+class SessionCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._ttu, timer=time.time)
+
+    def _ttu(self, key: str, value: Tuple[Any, float], now: float) -> float:
+        # Expire at whichever comes first: cache TTL or session expiry
+        return min(now + self.ttl, value[1])
+
+    def get(self, token: str) -> Optional[Any]:
+        entry = self._cache.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def set(self, token: str, user: Any, expires_at: datetime) -> None:
+        if self.ttl <= 0:
+            return
+        self._cache[token] = (user, expires_at.timestamp())
+
+    def invalidate(self, token: str) -> None:
+        self._cache.pop(token, None)
+
+    def invalidate_user(self, user_id: str) -> None:
+        stale = [token for token, (user, _) in list(self._cache.items()) if user.id == user_id]
+        for token in stale:
+            self._cache.pop(token, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
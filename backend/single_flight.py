@@ -0,0 +1,44 @@
+"""
+Short-lived keyed cache with single-flight refresh.
+
+When an entry is missing or stale, the first caller computes it while
+concurrent callers for the same key wait on a per-key lock and then reuse
+the fresh value, so N simultaneous requests cost one computation.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlightCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    def _fresh(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return True, entry[1]
+        return False, None
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if self.ttl <= 0:
+            return await compute()
+        fresh, value = self._fresh(key)
+        if fresh:
+            return value
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            fresh, value = self._fresh(key)
+            if fresh:
+                return value
+            value = await compute()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            return value
+
+    def invalidate(self, key: Hashable = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
@@ -0,0 +1,175 @@
+"""
+ASGI app serving uploaded images from the local storage folder (/uploads).
+
+Responses carry a strong ETag, Last-Modified and Accept-Ranges; conditional
+requests (If-None-Match / If-Modified-Since) get 304 and a single byte range
+gets 206 (If-Range honoured, 416 when unsatisfiable). Content-addressed files
+(<sha256>.<ext> and their <sha256>-<width>.<ext> derivatives) never change,
+so their ETag is the name and they are cacheable for a year as immutable.
+
+The body goes out via the ASGI zero-copy extensions when the server offers
+them (http.response.zerocopysend -> sendfile(2), or http.response.pathsend);
+otherwise it is read in chunks off the event loop.
+"""
+import mimetypes
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+
+from storage import IMMUTABLE_CACHE_CONTROL
+from uploads import IMAGE_TYPES
+
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}(-\d+)?\.[a-z0-9]+$")
+CHUNK_SIZE = 64 * 1024
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def _not_modified_since(header: Optional[str], mtime: float) -> bool:
+    if not header:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single-range header; None to serve the whole file.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        # Other units and multipart ranges: a full 200 response is allowed
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+class UploadFiles:
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+
+    def _resolve(self, path: str) -> Optional[Path]:
+        parts = [p for p in path.split("/") if p]
+        # No traversal and no dotfiles (the .staging area lives in here)
+        if not parts or any(p.startswith(".") for p in parts):
+            return None
+        full = (self.root / Path(*parts)).resolve()
+        if self.root not in full.parents:
+            return None
+        return full
+
+    async def __call__(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._respond(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+        path, root_path = scope["path"], scope.get("root_path", "")
+        # Under a Mount, root_path includes the mount prefix
+        full = self._resolve(path[len(root_path):] if path.startswith(root_path) else path)
+        try:
+            st = os.stat(full) if full else None
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            await self._respond(send, 404, body=b"Not Found")
+            return
+
+        request_headers = Headers(scope=scope)
+        name = full.name
+        immutable = bool(CONTENT_ADDRESSED.match(name))
+        etag = f'"{full.stem}"' if immutable else f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+        headers: List[Tuple[bytes, bytes]] = [
+            (b"etag", etag.encode()),
+            (b"last-modified", last_modified.encode()),
+            (b"cache-control", (IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL).encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+
+        if_none_match = request_headers.get("if-none-match")
+        if (_etag_matches(if_none_match, etag) if if_none_match
+                else _not_modified_since(request_headers.get("if-modified-since"), st.st_mtime)):
+            await self._respond(send, 304, headers)
+            return
+
+        size = st.st_size
+        status, start, end = 200, 0, size - 1
+        range_header = request_headers.get("range")
+        if_range = request_headers.get("if-range")
+        if range_header and size and (not if_range or if_range == etag or if_range == last_modified):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                await self._respond(send, 416, headers + [(b"content-range", f"bytes */{size}".encode())])
+                return
+            if byte_range:
+                status, (start, end) = 206, byte_range
+                headers.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+
+        ext = full.suffix[1:].lower()
+        content_type = IMAGE_TYPES[ext][0] if ext in IMAGE_TYPES else (
+            mimetypes.guess_type(name)[0] or "application/octet-stream"
+        )
+        count = end - start + 1 if size else 0
+        headers += [(b"content-type", content_type.encode()), (b"content-length", str(count).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if scope["method"] == "HEAD" or count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await self._send_file(scope, send, full, start, count)
+
+    async def _send_file(self, scope, send, path: Path, offset: int, count: int) -> None:
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            with open(path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": offset, "count": count})
+            return
+        if "http.response.pathsend" in extensions and offset == 0 and count == path.stat().st_size:
+            await send({"type": "http.response.pathsend", "path": str(path)})
+            return
+        async with await anyio.open_file(path, "rb") as f:
+            await f.seek(offset)
+            while count > 0:
+                chunk = await f.read(min(CHUNK_SIZE, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+        if count > 0:
+            # File shrank underneath us; close the response
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _respond(self, send, status: int, headers: Optional[List[Tuple[bytes, bytes]]] = None,
+                       body: bytes = b"") -> None:
+        headers = list(headers or [])
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
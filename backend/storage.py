@@ -0,0 +1,126 @@
+"""
+Object storage for uploaded files: local filesystem or S3-compatible.
+
+Each upload is written to its own temporary directory under the backend's
+staging_dir (image derivatives are rendered there too), then put() moves each
+file into storage under a content-addressed key and the directory is removed.
+Keys never change content, so a key that already exists is left as is and
+every object is served with IMMUTABLE_CACHE_CONTROL.
+
+STORAGE_BACKEND=local (default) keeps files in the uploads folder, served at
+/uploads. STORAGE_BACKEND=s3 uses S3_BUCKET plus optional S3_ENDPOINT_URL
+(e.g. MinIO), S3_REGION, S3_PREFIX and S3_PUBLIC_URL (CDN or public bucket
+URL); credentials come from the usual boto3 sources. Files above
+S3_MULTIPART_THRESHOLD go up as parallel multipart uploads.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class LocalStorage:
+    def __init__(self, root: Path, base_url: str = "/uploads"):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        # Inside root so put() is an atomic rename on the same filesystem
+        self.staging_dir = root / ".staging"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    async def put(self, key: str, path: Path, content_type: str) -> None:
+        destination = self.root / key
+        if destination.exists():
+            # Same content already stored (e.g. a concurrent upload of the same image)
+            return
+        os.replace(path, destination)
+
+    async def exists(self, key: str) -> bool:
+        return (self.root / key).exists()
+
+    async def get(self, key: str, path: Path) -> None:
+        await asyncio.to_thread(shutil.copyfile, self.root / key, path)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def key_for(self, url: str) -> Optional[str]:
+        """Inverse of url(): the key of a URL served from this storage, else None."""
+        prefix = self.base_url + "/"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, public_url: Optional[str] = None,
+                 staging_dir: Optional[Path] = None, multipart_threshold: int = 8 * 1024 * 1024,
+                 multipart_chunksize: int = 8 * 1024 * 1024, max_concurrency: int = 4):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self._transfer = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_concurrency
+        )
+        if public_url:
+            self._base_url = public_url.rstrip("/")
+        elif endpoint_url:
+            # Path-style, as MinIO and most S3-compatible servers expect
+            self._base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self._base_url = f"https://{bucket}.s3.{region or 'us-east-1'}.amazonaws.com"
+        self.staging_dir = staging_dir or Path(tempfile.gettempdir()) / "upload-staging"
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    async def put(self, key: str, path: Path, content_type: str) -> None:
+        # boto3 is blocking; upload_file switches to multipart above the threshold
+        await asyncio.to_thread(
+            self._client.upload_file, str(path), self.bucket, self.prefix + key,
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE_CACHE_CONTROL},
+            Config=self._transfer
+        )
+        path.unlink(missing_ok=True)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self._client.head_object, Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def get(self, key: str, path: Path) -> None:
+        await asyncio.to_thread(self._client.download_file, self.bucket, self.prefix + key, str(path))
+
+    def url(self, key: str) -> str:
+        return f"{self._base_url}/{self.prefix}{key}"
+
+    def key_for(self, url: str) -> Optional[str]:
+        """Inverse of url(): the key of a URL served from this storage, else None."""
+        prefix = f"{self._base_url}/{self.prefix}"
+        return url[len(prefix):] if url.startswith(prefix) else None
+
+
+def storage_from_env(local_root: Path):
+    if os.environ.get('STORAGE_BACKEND', 'local') == 's3':
+        staging = os.environ.get('UPLOAD_STAGING_DIR')
+        return S3Storage(
+            bucket=os.environ['S3_BUCKET'],
+            prefix=os.environ.get('S3_PREFIX', 'uploads/'),
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+            region=os.environ.get('S3_REGION'),
+            public_url=os.environ.get('S3_PUBLIC_URL'),
+            staging_dir=Path(staging) if staging else None,
+            multipart_threshold=int(os.environ.get('S3_MULTIPART_THRESHOLD', str(8 * 1024 * 1024)))
+        )
+    return LocalStorage(local_root)
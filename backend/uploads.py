@@ -0,0 +1,134 @@
+"""
+Streaming, size-limited intake of uploaded product images.
+
+The upload is copied to a temp file in fixed-size chunks, so memory use does
+not depend on the file size; the size limit is enforced while copying and
+the SHA-256 is computed on the fly. The image type comes from the file's
+magic bytes rather than the client's filename or Content-Type, and the file
+is named <sha256>.<ext>, so the same image always maps to the same storage
+key (see storage.py).
+
+Starlette spools the whole multipart body to disk before the route runs, so
+UploadLimitMiddleware turns away oversized multipart requests first: on their
+Content-Length before any of the body is read, or (chunked bodies) as soon as
+the bytes received pass the limit. The check in store_upload is the backstop.
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import aiofiles
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+CHUNK_SIZE = 64 * 1024
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# extension -> (content type, signature check on the first bytes)
+IMAGE_TYPES = {
+    "jpg": ("image/jpeg", lambda head: head.startswith(b"\xff\xd8\xff")),
+    "png": ("image/png", lambda head: head.startswith(b"\x89PNG\r\n\x1a\n")),
+    "gif": ("image/gif", lambda head: head[:6] in (b"GIF87a", b"GIF89a")),
+    "webp": ("image/webp", lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP"),
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UnsupportedImageType(Exception):
+    pass
+
+
+def content_type_for(filename: str) -> str:
+    return IMAGE_TYPES[filename.rsplit(".", 1)[-1]][0]
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Extension of the image format the leading bytes belong to, or None."""
+    for ext, (_, matches) in IMAGE_TYPES.items():
+        if matches(head):
+            return ext
+    return None
+
+
+async def store_upload(file, folder: Path, max_bytes: int) -> Dict[str, Any]:
+    """Stream an UploadFile into folder; returns filename, sha256, size, content_type."""
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    temp_path = folder / f".upload-{uuid.uuid4().hex}"
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = sniff_image_type(chunk)
+                    if ext is None:
+                        raise UnsupportedImageType("File is not a JPEG, PNG, GIF or WebP image")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await out.write(chunk)
+        if ext is None:
+            raise UnsupportedImageType("File is empty")
+
+        sha256 = digest.hexdigest()
+        filename = f"{sha256}.{ext}"
+        os.replace(temp_path, folder / filename)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return {
+        "filename": filename,
+        "sha256": sha256,
+        "size": size,
+        "content_type": IMAGE_TYPES[ext][0],
+    }
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_body = max_bytes + MULTIPART_OVERHEAD
+        self.detail = f"File exceeds {max_bytes} bytes"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body:
+            response = JSONResponse({"detail": self.detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Raised inside form parsing, which passes HTTPException through
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
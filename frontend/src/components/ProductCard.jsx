@@ -11,12 +11,17 @@ export default function ProductCard({ product }) {
 
   const name = product.name[currentLang] || product.name.en;
   const firstImage = product.images[0] || 'https://via.placeholder.com/400x500';
+  const variants = (product.image_variants || []).find(v => v.src === firstImage);
+  const sizes = '(min-width: 1024px) 25vw, (min-width: 640px) 50vw, 100vw';
   const hasStock = product.sizes_stock.some(s => s.stock > 0);
 
   return (
     <div className="group relative bg-white rounded-2xl overflow-hidden shadow-lg hover:shadow-2xl transition-all duration-500 cursor-pointer border border-gray-100" data-testid={`product-card-${product.id}`}>
       <div className="relative aspect-square overflow-hidden bg-gray-50" onClick={() => navigate(`/product/${product.id}`)}>
-        <img src={firstImage} alt={name} className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-110" data-testid="product-image" />
+        <picture className="block w-full h-full">
+          {variants?.srcset?.webp && <source type="image/webp" srcSet={variants.srcset.webp} sizes={sizes} />}
+          <img src={firstImage} srcSet={variants?.srcset?.jpeg} sizes={variants ? sizes : undefined} alt={name} loading="lazy" className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-110" data-testid="product-image" />
+        </picture>
         
         <div className="absolute inset-0 bg-gradient-to-t from-black/60 via-transparent to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-300"></div>
         
@@ -30,17 +30,15 @@ export default function Cart() {
 
   const fetchCart = async () => {
     try {
-      const response = await axios.get(`${API}/cart`, { withCredentials: true });
+      // Cart with product details joined server-side
+      const response = await axios.get(`${API}/cart`, { params: { expand: 'products' }, withCredentials: true });
       setCart(response.data);
       
-      // Fetch product details
-      const productIds = [...new Set(response.data.items.map(item => item.product_id))];
-      const productPromises = productIds.map(id => axios.get(`${API}/products/${id}`));
-      const productResponses = await Promise.all(productPromises);
-      
       const productsMap = {};
-      productResponses.forEach(res => {
-        productsMap[res.data.id] = res.data;
+      response.data.lines.forEach(line => {
+        if (line.product) {
+          productsMap[line.product_id] = line.product;
+        }
       });
       setProducts(productsMap);
     } catch (error) {
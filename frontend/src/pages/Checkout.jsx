@@ -47,14 +47,12 @@ export default function Checkout() {
       
       // Fetch products
       const productIds = [...new Set(cartRes.data.items.map(item => item.product_id))];
-      const productPromises = productIds.map(id => axios.get(`${API}/products/${id}`));
-      const productResponses = await Promise.all(productPromises);
-      
-      const productsMap = {};
-      productResponses.forEach(res => {
-        productsMap[res.data.id] = res.data;
-      });
-      setProducts(productsMap);
+      if (productIds.length > 0) {
+        const productsRes = await axios.get(`${API}/products/batch`, { params: { ids: productIds.join(',') } });
+        setProducts(productsRes.data);
+      } else {
+        setProducts({});
+      }
     } catch (error) {
       console.error('Error fetching data:', error);
       toast.error('Failed to load checkout data');
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Load Test - weighted shopper scenarios against a running backend, with
+per-step latency percentiles and throughput written to JSON.
+
+Scenarios (weights set with --mix):
+  browse    featured products, then a category page
+  search    product search
+  view      product detail, reviews and rating
+  cart      view a product and add it to the cart
+  checkout  add to cart and place a COD order (consumes stock!)
+  admin     admin dashboard analytics
+
+Sessions arrive at --rate per second (open model, Poisson arrivals) with at
+most --concurrency in flight; --rate 0 instead keeps --concurrency sessions
+looping back to back (closed model). Customers are registered up front
+(--users), so bcrypt cost stays out of the measured steps.
+
+Run it against a local server with a seeded, disposable database: checkout
+places real orders.
+
+Usage:
+    BASE_URL=http://127.0.0.1:8000 python load_test.py --duration 60 --rate 20 \\
+        --output load_results.json [--compare previous.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+
+import httpx
+
+BASE_URL = os.environ.get("BASE_URL", "http://127.0.0.1:8000")
+ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@momezshoes.com")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "Admin123!")
+DEFAULT_MIX = "browse=35,search=20,view=25,cart=10,checkout=5,admin=5"
+SEARCH_TERMS = ["shoe", "sneaker", "boot", "leather", "sport", "classic", "black", "white"]
+
+
+class StepFailed(Exception):
+    pass
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadTest:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(lambda: defaultdict(int))
+        self.scenarios = defaultdict(lambda: {"completed": 0, "failed": 0})
+        self.queue_waits = []
+        self.products = []
+        self.categories = []
+        self.regions = []
+        self.customers = []
+        self.admin = None
+        self.started_at = None
+
+    async def step(self, name, method, path, token=None, expected=(200,), **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        start = time.perf_counter()
+        try:
+            r = await self.client.request(method, f"/api{path}", headers=headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.errors[name] += 1
+            self.status_codes[name][type(e).__name__] += 1
+            raise StepFailed(f"{name}: {e!r}")
+        self.latencies[name].append(time.perf_counter() - start)
+        self.status_codes[name][str(r.status_code)] += 1
+        if r.status_code not in expected:
+            self.errors[name] += 1
+            raise StepFailed(f"{name}: HTTP {r.status_code}")
+        return r
+
+    # Setup
+
+    async def setup(self):
+        r = await self.client.post("/api/admin/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        if r.status_code != 200:
+            raise SystemExit(f"❌ Admin login failed: {r.status_code}")
+        self.admin = r.json()["session_token"]
+
+        products = (await self.client.get("/api/products")).json()
+        self.products = [p for p in products if any(s["stock"] > 0 for s in p["sizes_stock"])]
+        if not self.products:
+            raise SystemExit("❌ No products in stock - seed the database first")
+        self.categories = sorted({p["category"] for p in self.products})
+        self.regions = (await self.client.get("/api/shipping-regions")).json()
+        if not self.regions:
+            raise SystemExit("❌ No shipping regions configured")
+
+        run = uuid.uuid4().hex[:8]
+        for i in range(self.args.users):
+            r = await self.client.post("/api/auth/register", json={
+                "email": f"load-{run}-{i}@example.com", "password": "LoadTest123!", "name": f"Load {i}"
+            })
+            if r.status_code != 200:
+                raise SystemExit(f"❌ Customer registration failed: {r.status_code}")
+            self.customers.append(r.json()["session_token"])
+        print(f"✅ Setup: {len(self.products)} products, {len(self.regions)} regions, {len(self.customers)} customers")
+
+    # Scenarios
+
+    def pick_product(self):
+        product = random.choice(self.products)
+        sizes = [s["size"] for s in product["sizes_stock"] if s["stock"] > 0] or [product["sizes_stock"][0]["size"]]
+        return product["id"], random.choice(sizes)
+
+    async def browse(self):
+        await self.step("browse.featured", "GET", "/products", params={"featured": "true"})
+        await self.step("browse.category", "GET", "/products",
+                        params={"category": random.choice(self.categories), "limit": 20})
+
+    async def search(self):
+        await self.step("search.query", "POST", "/products/search",
+                        json={"query": random.choice(SEARCH_TERMS), "limit": 20})
+
+    async def view(self):
+        product_id, _ = self.pick_product()
+        await self.step("view.product", "GET", f"/products/{product_id}")
+        await self.step("view.reviews", "GET", f"/products/{product_id}/reviews")
+        await self.step("view.rating", "GET", f"/products/{product_id}/rating")
+
+    async def cart(self):
+        token = random.choice(self.customers)
+        product_id, size = self.pick_product()
+        await self.step("cart.product", "GET", f"/products/{product_id}")
+        # 400 = sold out since setup; counted per status code, not as a failure
+        await self.step("cart.add", "POST", "/cart/add", token, expected=(200, 400),
+                        json={"product_id": product_id, "size": size, "quantity": 1})
+        await self.step("cart.view", "GET", "/cart", token)
+
+    async def checkout(self):
+        token = random.choice(self.customers)
+        product_id, size = self.pick_product()
+        await self.step("checkout.clear_cart", "POST", "/cart/clear", token)
+        await self.step("checkout.add", "POST", "/cart/add", token, expected=(200, 400),
+                        json={"product_id": product_id, "size": size, "quantity": 1})
+        await self.step("checkout.regions", "GET", "/shipping-regions")
+        await self.step("checkout.order", "POST", "/orders", token, expected=(200, 400), json={
+            "shipping_region_id": random.choice(self.regions)["id"],
+            "customer_name": "Load Test",
+            "customer_email": "load@example.com",
+            "customer_phone": "",
+            "shipping_address": "Load test street 1"
+        })
+
+    async def admin_dashboard(self):
+        await self.step("admin.dashboard", "GET", "/admin/analytics/dashboard", self.admin)
+
+    # Driver
+
+    async def session(self, name, scenario):
+        try:
+            await scenario()
+            self.scenarios[name]["completed"] += 1
+        except StepFailed as e:
+            self.scenarios[name]["failed"] += 1
+            if self.args.verbose:
+                print(f"  ⚠️  {e}")
+
+    async def run(self, mix):
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        scenarios = {
+            "browse": self.browse, "search": self.search, "view": self.view,
+            "cart": self.cart, "checkout": self.checkout, "admin": self.admin_dashboard,
+        }
+        deadline = time.perf_counter() + self.args.duration
+
+        if self.args.rate <= 0:
+            async def worker():
+                while time.perf_counter() < deadline:
+                    name = random.choices(names, weights)[0]
+                    await self.session(name, scenarios[name])
+            await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+            return
+
+        slots = asyncio.Semaphore(self.args.concurrency)
+        pending = set()
+
+        async def arrival(name):
+            queued = time.perf_counter()
+            async with slots:
+                self.queue_waits.append(time.perf_counter() - queued)
+                await self.session(name, scenarios[name])
+
+        while True:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if time.perf_counter() >= deadline:
+                break
+            task = asyncio.create_task(arrival(random.choices(names, weights)[0]))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    def report(self, elapsed):
+        steps = {}
+        for name in sorted(self.latencies):
+            ordered = sorted(self.latencies[name])
+            steps[name] = {
+                "count": len(ordered),
+                "errors": self.errors[name],
+                "status_codes": dict(self.status_codes[name]),
+                "throughput_rps": round(len(ordered) / elapsed, 2),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+                "p90_ms": round(percentile(ordered, 0.90) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        total = sum(s["count"] for s in steps.values())
+        waits = sorted(self.queue_waits)
+        return {
+            "base_url": self.args.base_url,
+            "started_at": self.started_at,
+            "config": {
+                "duration": self.args.duration,
+                "concurrency": self.args.concurrency,
+                "rate": self.args.rate,
+                "users": self.args.users,
+                "mix": self.args.mix,
+            },
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": total,
+            "errors": sum(s["errors"] for s in steps.values()),
+            "throughput_rps": round(total / elapsed, 2),
+            "queue_wait_p99_ms": round(percentile(waits, 0.99) * 1000, 2),
+            "scenarios": dict(self.scenarios),
+            "steps": steps,
+        }
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("browse", "search", "view", "cart", "checkout", "admin"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def print_report(result, baseline=None):
+    print(f"\n📊 {result['requests']} requests in {result['elapsed_seconds']}s "
+          f"({result['throughput_rps']} req/s), {result['errors']} errors")
+    header = f"{'step':<22}{'count':>7}{'err':>5}{'rps':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    if baseline:
+        header += f"{'Δp50':>9}{'Δp99':>9}"
+    print(header)
+    for name, s in result["steps"].items():
+        line = (f"{name:<22}{s['count']:>7}{s['errors']:>5}{s['throughput_rps']:>8}"
+                f"{s['p50_ms']:>9}{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+        before = (baseline or {}).get("steps", {}).get(name)
+        if before:
+            line += f"{s['p50_ms'] - before['p50_ms']:>+9.1f}{s['p99_ms'] - before['p99_ms']:>+9.1f}"
+        print(line)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Async load test with weighted shopper scenarios")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load")
+    parser.add_argument("--concurrency", type=int, default=20, help="Max sessions in flight")
+    parser.add_argument("--rate", type=float, default=10, help="Session arrivals per second; 0 = closed loop")
+    parser.add_argument("--users", type=int, default=10, help="Customers registered for cart/checkout")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, e.g. browse=3,view=1")
+    parser.add_argument("--seed", type=int, help="Random seed for a repeatable request mix")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Previous JSON report to diff p50/p99 against")
+    parser.add_argument("--verbose", action="store_true", help="Print failed steps")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Auth is by Bearer token only; a shared cookie jar would mix customers' sessions
+    no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, cookies=no_cookies, limits=limits,
+                                 timeout=httpx.Timeout(30.0)) as client:
+        test = LoadTest(client, args)
+        await test.setup()
+        print(f"🚀 {args.duration:g}s at {args.rate:g} sessions/s, concurrency {args.concurrency}, mix {args.mix}")
+        test.started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        await test.run(mix)
+        result = test.report(time.perf_counter() - start)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
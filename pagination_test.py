@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Pagination Test - keyset cursors for product listings: walking every page
+with each sort order returns every product exactly once and in order
+(including ties on the sort value), and malformed, tampered or wrong-sort
+cursors are rejected (the API answers those with 400). No server or
+database needed: the generated query is evaluated on an in-memory list.
+"""
+import base64
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from pagination import InvalidCursor, apply_cursor, encode_cursor, sort_spec
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Prices and timestamps repeat, so pages break inside runs of equal sort values
+PRODUCTS = [
+    {"id": f"p{i:02d}", "price": float(i % 4) * 10, "created_at": START + timedelta(days=i % 5),
+     "name": {"en": f"Shoe {i % 3}"}, "category": "men" if i % 2 else "women"}
+    for i in range(23)
+]
+
+def field_value(doc, field):
+    for part in field.split("."):
+        doc = doc[part]
+    return doc
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = field_value(doc, key)
+            for op, operand in condition.items():
+                if op == "$gt" and not value > operand or op == "$lt" and not value < operand:
+                    return False
+        elif field_value(doc, key) != condition:
+            return False
+    return True
+
+def find(query, sort_by, limit):
+    docs = [doc for doc in PRODUCTS if matches(doc, query)]
+    for field, direction in reversed(sort_spec(sort_by)):
+        docs.sort(key=lambda doc: field_value(doc, field), reverse=direction == -1)
+    return docs[:limit]
+
+def walk(sort_by, limit, query=None):
+    # Same steps as pagination.fetch_page
+    seen, cursor = [], None
+    while True:
+        docs = find(apply_cursor(query or {}, sort_by, cursor), sort_by, limit + 1)
+        seen += [doc["id"] for doc in docs[:limit]]
+        if len(docs) <= limit:
+            return seen
+        cursor = encode_cursor(sort_by, docs[limit - 1])
+
+def tamper(cursor, **changes):
+    data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    data.update(changes)
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+def rejected(sort_by, cursor):
+    try:
+        apply_cursor({}, sort_by, cursor)
+    except InvalidCursor:
+        return True
+    return False
+
+def main():
+    results = []
+    for sort_by in ("created_at", "price_asc", "price_desc", "name"):
+        expected = [doc["id"] for doc in find({}, sort_by, len(PRODUCTS))]
+        results.append((f"{sort_by}: pages of 4 cover every product once, in order", walk(sort_by, 4) == expected))
+        results.append((f"{sort_by}: pages of 1 cover every product once, in order", walk(sort_by, 1) == expected))
+
+    men = [doc["id"] for doc in find({"category": "men"}, "price_asc", len(PRODUCTS))]
+    results.append(("Filter is kept on every page", walk("price_asc", 3, {"category": "men"}) == men))
+
+    by_date = find({}, "created_at", 5)
+    cursor = encode_cursor("created_at", by_date[-1])
+    results.append(("created_at cursor round-trips the datetime",
+                    apply_cursor({}, "created_at", cursor)["$or"][1]["created_at"] == by_date[-1]["created_at"]))
+    by_price = find({}, "price_asc", 5)
+    cursor = encode_cursor("price_asc", by_price[-1])
+    after = apply_cursor({}, "price_asc", cursor)
+    results.append(("price_asc cursor seeks after (price, id)",
+                    after == {"$or": [{"price": {"$gt": by_price[-1]["price"]}},
+                                      {"price": by_price[-1]["price"], "id": {"$gt": by_price[-1]["id"]}}]}))
+    results.append(("Empty cursor leaves the query alone", apply_cursor({"category": "men"}, "price_asc", None) == {"category": "men"}))
+    results.append(("Unknown sort falls back to created_at", sort_spec("bogus") == sort_spec("created_at")))
+
+    results += [
+        ("Cursor from another sort rejected", rejected("price_desc", cursor)),
+        ("Garbage rejected", rejected("price_asc", "not-a-cursor!!")),
+        ("Non-JSON base64 rejected", rejected("price_asc", base64.urlsafe_b64encode(b"\xff\xfe").decode())),
+        ("Missing id rejected", rejected("price_asc", base64.urlsafe_b64encode(b'{"s": "price_asc", "v": 1}').decode())),
+        ("Operator as value rejected", rejected("price_asc", tamper(cursor, v={"$gt": 0}))),
+        ("Operator as id rejected", rejected("price_asc", tamper(cursor, id={"$ne": None}))),
+        ("List as value rejected", rejected("price_asc", tamper(cursor, v=[1, 2]))),
+        ("Bad $date rejected", rejected("created_at", tamper(encode_cursor("created_at", by_date[0]), v={"$date": "yesterday"}))),
+    ]
+
+    for name, success in results:
+        print(f"{'✅ PASS' if success else '❌ FAIL'} - {name}")
+    return 0 if all(success for _, success in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
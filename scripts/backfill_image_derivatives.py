@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Backfill image_variants (srcset derivatives) for existing product images.
+
+Originals in the configured storage backend (local /uploads or the S3
+bucket, plus /uploads files left from before a switch to S3) are fetched,
+rendered to WebP/JPEG derivatives in a process pool and published to that
+backend; remote images on a host with URL-based resizing (Unsplash) get
+srcset entries built from query parameters. Images that already have an entry are skipped, so the script
+can be re-run safely.
+
+Usage:
+    python scripts/backfill_image_derivatives.py [--workers N]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from image_derivatives import ImageDerivativePool, build_entry, remote_entry
+from storage import storage_from_env
+from uploads import content_type_for
+
+load_dotenv(Path(__file__).parent.parent / 'backend' / '.env')
+
+UPLOAD_FOLDER = Path(__file__).parent.parent / "frontend" / "public" / "uploads"
+
+async def variants_for(pool, storage, url):
+    key = storage.key_for(url)
+    # /uploads files stored locally before a switch to S3 are still rendered
+    legacy = UPLOAD_FOLDER / url[len("/uploads/"):] if key is None and url.startswith("/uploads/") else None
+    if key is None and legacy is None:
+        return remote_entry(url)
+    if not (await storage.exists(key) if key else legacy.exists()):
+        print(f"  ⚠️  {url}: file not found")
+        return None
+    # Render from a staged copy in its own directory, removed afterwards
+    staging = Path(tempfile.mkdtemp(dir=storage.staging_dir))
+    try:
+        staged = staging / Path(url).name
+        if key:
+            await storage.get(key, staged)
+        else:
+            shutil.copyfile(legacy, staged)
+        rendered = await pool.render(staged)
+        await asyncio.gather(*(
+            storage.put(v["file"], staging / v["file"], content_type_for(v["file"]))
+            for v in rendered["variants"]
+        ))
+        return build_entry(url, storage.url, rendered)
+    except Exception as e:
+        print(f"  ⚠️  {url}: {e}")
+        return None
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Render srcset derivatives for existing product images")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    pool = ImageDerivativePool(max_workers=args.workers)
+    storage = storage_from_env(UPLOAD_FOLDER)
+    updated = 0
+    try:
+        async for product in db.products.find({}, {"_id": 0, "id": 1, "images": 1, "image_variants": 1}):
+            done = {entry["src"] for entry in product.get("image_variants", [])}
+            pending = [url for url in product.get("images", []) if url not in done]
+            if not pending:
+                continue
+            entries = [e for e in await asyncio.gather(*(variants_for(pool, storage, url) for url in pending)) if e]
+            if entries:
+                await db.products.update_one(
+                    {"id": product["id"]},
+                    {"$addToSet": {"image_variants": {"$each": entries}}}
+                )
+                updated += 1
+                print(f"  {product['id']}: {len(entries)} image(s)")
+        print(f"✅ {updated} product(s) updated")
+    finally:
+        pool.shutdown()
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
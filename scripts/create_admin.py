@@ -48,7 +48,7 @@ async def create_admin():
         "picture": None,
         "password": password_hash.decode('utf-8'),  # Store as string
         "role": "admin",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.users.insert_one(admin_user)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Create or verify MongoDB indexes.
+
+Usage:
+    python scripts/manage_indexes.py ensure   # create every registered index
+    python scripts/manage_indexes.py verify   # explain() each route query shape, exit 1 on COLLSCAN
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from db_indexes import ensure_indexes, verify_query_shapes
+
+load_dotenv(Path(__file__).parent.parent / 'backend' / '.env')
+
+async def main(mode):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        await ensure_indexes(db)
+        print("✅ Indexes ensured")
+        if mode == "verify":
+            failures = await verify_query_shapes(db)
+            if failures:
+                print(f"❌ {len(failures)} query shape(s) use a COLLSCAN:")
+                for failure in failures:
+                    print(f"  - {failure}")
+                return 1
+            print("✅ All query shapes are index-backed")
+        return 0
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "ensure"
+    if mode not in ("ensure", "verify"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(main(mode)))
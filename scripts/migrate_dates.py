@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Convert legacy ISO-string timestamps to native BSON dates.
+
+Walks every collection in bson_dates.DATE_FIELDS in _id order, converting
+string values in batches. Progress is checkpointed per collection in the
+`migrations` collection, so an interrupted run resumes where it stopped;
+pass --restart to rescan from the beginning (e.g. after old API instances
+kept writing strings during a rollout). Each update is conditional on the
+string it read, so rows rewritten concurrently by the API are left alone.
+
+Usage:
+    python scripts/migrate_dates.py [--batch-size N] [--dry-run] [--restart] [collection ...]
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from bson_dates import CODEC_OPTIONS, DATE_FIELDS, as_datetime
+
+load_dotenv(Path(__file__).parent.parent / 'backend' / '.env')
+
+async def migrate_collection(db, name, fields, batch_size, dry_run, restart):
+    checkpoint_id = f"dates:{name}"
+    if restart and not dry_run:
+        await db.migrations.delete_one({"_id": checkpoint_id})
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("last_id")
+
+    converted = skipped = 0
+    legacy = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    while True:
+        query = {"$and": [legacy, {"_id": {"$gt": last_id}}]} if last_id else legacy
+        docs = await db[name].find(query, {field: 1 for field in fields}).sort("_id", 1).to_list(batch_size)
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            updates, original = {}, {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    updates[field] = as_datetime(value)
+                    original[field] = value
+                except ValueError:
+                    skipped += 1
+                    print(f"  ⚠️  {name} {doc['_id']}: unparseable {field}={value!r}")
+            if updates:
+                ops.append(UpdateOne({"_id": doc["_id"], **original}, {"$set": updates}))
+        if ops and not dry_run:
+            result = await db[name].bulk_write(ops, ordered=False)
+            converted += result.modified_count
+        else:
+            converted += len(ops)
+        last_id = docs[-1]["_id"]
+        if not dry_run:
+            await db.migrations.update_one({"_id": checkpoint_id}, {"$set": {"last_id": last_id}}, upsert=True)
+    return converted, skipped
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate ISO-string timestamps to BSON dates")
+    parser.add_argument("collections", nargs="*", help="collections to migrate (default: all)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count rows without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    args = parser.parse_args()
+
+    unknown = set(args.collections) - set(DATE_FIELDS)
+    if unknown:
+        parser.error(f"unknown collection(s): {', '.join(sorted(unknown))}")
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=CODEC_OPTIONS.tz_aware, tzinfo=CODEC_OPTIONS.tzinfo)
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in args.collections or DATE_FIELDS:
+            print(f"Migrating {name} {DATE_FIELDS[name]}...")
+            converted, skipped = await migrate_collection(
+                db, name, DATE_FIELDS[name], args.batch_size, args.dry_run, args.restart
+            )
+            verb = "would convert" if args.dry_run else "converted"
+            print(f"✅ {name}: {verb} {converted} document(s), {skipped} unparseable value(s)")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
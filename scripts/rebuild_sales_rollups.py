@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Rebuild the sales_daily rollups behind the admin reports from the orders
+collection. Run once after deploying rollups, and whenever a rollup update
+was logged as failed. Orders placed while it runs may be missed; run it at
+a quiet time.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Add backend to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+import sales_rollup
+from db_indexes import ensure_indexes
+
+load_dotenv(Path(__file__).parent.parent / 'backend' / '.env')
+
+async def main():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        print("Rebuilding sales rollups...")
+        rows = await sales_rollup.rebuild(db)
+        # The swapped-in collection has no indexes yet
+        await ensure_indexes(db)
+        print(f"✅ {rows} rollup rows written")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
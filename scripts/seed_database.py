@@ -86,7 +86,7 @@ products = [
             {"size": "XL", "stock": 8}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -111,7 +111,7 @@ products = [
             {"size": "36", "stock": 6}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -135,7 +135,7 @@ products = [
             {"size": "XL", "stock": 4}
         ],
         "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # Women's products
     {
@@ -161,7 +161,7 @@ products = [
             {"size": "L", "stock": 6}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -185,7 +185,7 @@ products = [
             {"size": "L", "stock": 8}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -210,7 +210,7 @@ products = [
             {"size": "32", "stock": 5}
         ],
         "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # Sports products
     {
@@ -236,7 +236,7 @@ products = [
             {"size": "11", "stock": 8}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -261,7 +261,7 @@ products = [
             {"size": "XL", "stock": 12}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # New Arrivals
     {
@@ -286,7 +286,7 @@ products = [
             {"size": "L", "stock": 6}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -310,7 +310,7 @@ products = [
             {"size": "XL", "stock": 4}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
 ]
 
@@ -324,7 +324,7 @@ admin_user = {
     "name": "Admin User",
     "picture": None,
     "role": "admin",
-    "created_at": datetime.now(timezone.utc).isoformat()
+    "created_at": datetime.now(timezone.utc)
 }
 db.users.insert_one(admin_user)
 
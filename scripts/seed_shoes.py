@@ -51,7 +51,7 @@ products = [
             {"size": "44", "stock": 10}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -77,7 +77,7 @@ products = [
             {"size": "44", "stock": 6}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -103,7 +103,7 @@ products = [
             {"size": "44", "stock": 8}
         ],
         "featured": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # Women's Shoes
     {
@@ -130,7 +130,7 @@ products = [
             {"size": "40", "stock": 8}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -156,7 +156,7 @@ products = [
             {"size": "40", "stock": 10}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -182,7 +182,7 @@ products = [
             {"size": "40", "stock": 6}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # Sports Shoes
     {
@@ -209,7 +209,7 @@ products = [
             {"size": "44", "stock": 12}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -235,7 +235,7 @@ products = [
             {"size": "44", "stock": 10}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     # New Arrivals
     {
@@ -262,7 +262,7 @@ products = [
             {"size": "44", "stock": 4}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": str(uuid.uuid4()),
@@ -288,7 +288,7 @@ products = [
             {"size": "44", "stock": 5}
         ],
         "featured": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
 ]
 
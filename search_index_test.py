@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Search Index Test - normalization (Turkish dotted/dotless i, Latin accents,
+Arabic hamza/harakat/teh marbuta), prefix matching and BM25 ranking of the
+in-memory product index behind /products/search. No server or database needed.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+from search_index import ProductSearchIndex, normalize, tokenize
+
+PRODUCTS = [
+    {"id": "p1", "sku": "AYK-001", "category": "men", "price": 100.0,
+     "name": {"en": "Leather Shoe", "tr": "Deri Ayakkabı", "ar": "حذاء جلد"},
+     "description": {"en": "Classic leather shoe", "tr": "Klasik İstanbul işçiliği", "ar": "أحذية كلاسيكية"}},
+    {"id": "p2", "sku": "SNK-002", "category": "women", "price": 250.0,
+     "name": {"en": "Running Sneaker", "tr": "Koşu Ayakkabısı", "ar": "حذاء رياضي"},
+     "description": {"en": "Light sneaker for running", "tr": "Hafif", "ar": "خفيفة"}},
+    {"id": "p3", "sku": "BOT-003", "category": "men", "price": 400.0,
+     "name": {"en": "Winter Boot", "tr": "Kışlık Bot", "ar": "جزمة شتوية"},
+     "description": {"en": "Warm boot, leather upper", "tr": "Sıcak", "ar": "دافئة"}},
+]
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+def main():
+    index = ProductSearchIndex()
+    index.build(PRODUCTS)
+
+    results = [
+        ("Dotless ı folds to i", normalize("Ayakkabı") == "ayakkabi"),
+        ("Dotted İ folds to i", normalize("İSTANBUL") == "istanbul"),
+        ("Plain I folds to i", normalize("ISPARTA") == normalize("ısparta")),
+        ("Latin accents dropped", normalize("Kışlık Şık Güzel") == "kislik sik guzel"),
+        ("Arabic hamza on alef dropped", normalize("أحذية") == normalize("احذية")),
+        ("Arabic harakat dropped", normalize("حِذَاء") == normalize("حذاء")),
+        ("Arabic teh marbuta and alef maksura unified", normalize("شتوية") == normalize("شتويه") and normalize("على") == normalize("علي")),
+        ("Arabic tatweel dropped", normalize("حـــذاء") == normalize("حذاء")),
+        ("Tokenizer splits on punctuation", tokenize("AYK-001, Deri") == ["ayk", "001", "deri"]),
+        ("ASCII query finds Turkish name", ids(index.search("ayakkabi"))[:1] == ["p1"]),
+        ("Upper-case and dotless queries agree", index.search("AYAKKABI") == index.search("ayakkabı") == index.search("ayakkabi")),
+        ("Arabic query without hamza", ids(index.search("احذية")) == ["p1"]),
+        ("Prefix matches longer terms", set(ids(index.search("ayak"))) == {"p1", "p2"}),
+        ("Exact term outranks prefix match", ids(index.search("ayakkabi"))[:1] == ["p1"] and ids(index.search("ayakkabisi")) == ["p2"]),
+        ("Every query token must match", ids(index.search("leather boot")) == ["p3"]),
+        ("Name match outranks description match", ids(index.search("leather")) == ["p1", "p3"]),
+        ("SKU search", ids(index.search("snk 002")) == ["p2"]),
+        ("Category filter", ids(index.search("leather", category="men")) == ["p1", "p3"] and ids(index.search("leather", category="women")) == []),
+        ("Price filter", ids(index.search("leather", min_price=200)) == ["p3"] and ids(index.search("leather", max_price=200)) == ["p1"]),
+        ("No match", index.search("sandalet") == [] and index.search("   ") == []),
+    ]
+
+    index.remove("p1")
+    index.add({**PRODUCTS[1], "name": {"en": "Trail Sneaker"}})
+    results += [
+        ("Removed product no longer found", ids(index.search("ayakkabi")) == []),
+        ("Updated product reindexed", ids(index.search("trail")) == ["p2"] and ids(index.search("running")) == ["p2"] and ids(index.search("kosu")) == []),
+        ("Unused terms dropped from the prefix list", ids(index.search("deri")) == []),
+    ]
+
+    for name, success in results:
+        print(f"{'✅ PASS' if success else '❌ FAIL'} - {name}")
+    return 0 if all(success for _, success in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Stock Concurrency Test - many customers check out the same size at once;
+exactly `stock` orders may succeed and stock must end at zero (no oversell).
+
+Usage: BASE_URL=http://127.0.0.1:8000 python stock_concurrency_test.py
+"""
+import os
+import sys
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get("BASE_URL", "http://127.0.0.1:8000")
+API_URL = f"{BASE_URL}/api"
+ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@momezshoes.com")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "Admin123!")
+STOCK = int(os.environ.get("STOCK", "5"))
+CUSTOMERS = int(os.environ.get("CUSTOMERS", "25"))
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+
+def main():
+    print("🔒 Testing concurrent checkout of one size...")
+
+    r = requests.post(f"{API_URL}/admin/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    if r.status_code != 200:
+        print(f"❌ Admin login failed: {r.status_code}")
+        return 1
+    admin = auth(r.json()['session_token'])
+
+    # Product with a single size holding STOCK pairs
+    suffix = uuid.uuid4().hex[:8]
+    product_data = {
+        "sku": f"CONC-{suffix}",
+        "name_en": f"Concurrency Shoe {suffix}", "name_ar": "حذاء", "name_tr": "Ayakkabı",
+        "description_en": "d", "description_ar": "d", "description_tr": "d",
+        "price": 10.0, "category": "men",
+        "sizes_stock": [{"size": "42", "stock": STOCK}],
+        "featured": False
+    }
+    r = requests.post(f"{API_URL}/admin/products", json=product_data, headers=admin)
+    if r.status_code != 200:
+        print(f"❌ Product creation failed: {r.status_code}")
+        return 1
+    product_id = r.json()['id']
+
+    regions = requests.get(f"{API_URL}/shipping-regions").json()
+    if not regions:
+        print("❌ No shipping regions")
+        return 1
+    region_id = regions[0]['id']
+
+    # Each customer puts one pair in the cart
+    customers = []
+    for i in range(CUSTOMERS):
+        r = requests.post(f"{API_URL}/auth/register", json={
+            "email": f"conc_{suffix}_{i}@example.com", "password": "Test123!", "name": f"Customer {i}"
+        })
+        headers = auth(r.json()['session_token'])
+        r = requests.post(f"{API_URL}/cart/add", json={"product_id": product_id, "size": "42", "quantity": 1}, headers=headers)
+        if r.status_code != 200:
+            print(f"❌ Add to cart failed: {r.status_code} {r.text}")
+            return 1
+        customers.append(headers)
+    print(f"    ✅ {CUSTOMERS} carts ready for {STOCK} pairs")
+
+    def checkout(headers):
+        return requests.post(f"{API_URL}/orders", json={
+            "shipping_region_id": region_id,
+            "customer_name": "Concurrency",
+            "customer_email": "conc@example.com",
+            "customer_phone": "",
+            "shipping_address": "Test"
+        }, headers=headers).status_code
+
+    with ThreadPoolExecutor(max_workers=CUSTOMERS) as pool:
+        statuses = list(pool.map(checkout, customers))
+
+    succeeded = statuses.count(200)
+    remaining = requests.get(f"{API_URL}/products/{product_id}").json()['sizes_stock'][0]['stock']
+    print(f"    Orders succeeded: {succeeded}, rejected: {statuses.count(400)}, remaining stock: {remaining}")
+
+    requests.delete(f"{API_URL}/admin/products/{product_id}", headers=admin)
+
+    if succeeded == STOCK and remaining == 0:
+        print("✅ No oversell")
+        return 0
+    print("❌ Oversell or lost stock detected")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
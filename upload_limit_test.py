@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Upload Limit Test - an image over MAX_UPLOAD_BYTES is refused with 413 before
+its body is read, and the refusal still carries the CORS headers, so the
+cross-origin admin panel can show "file too large".
+
+Usage: BASE_URL=http://127.0.0.1:8000 ORIGIN=http://localhost:3000 python upload_limit_test.py
+"""
+import os
+import sys
+import uuid
+import requests
+
+BASE_URL = os.environ.get("BASE_URL", "http://127.0.0.1:8000")
+API_URL = f"{BASE_URL}/api"
+ORIGIN = os.environ.get("ORIGIN", "http://localhost:3000")
+ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@momezshoes.com")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "Admin123!")
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+PNG = (
+    b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x02\x00\x00\x00\x90wS\xde"
+    b"\x00\x00\x00\x0cIDATx\x9cc8\xc1\xc0\x00\x00\x02\\\x00\xc9C\xc8\x12F\x00\x00\x00\x00IEND\xaeB`\x82"
+)
+
+def main():
+    print("📦 Testing the upload size limit...")
+
+    r = requests.post(f"{API_URL}/admin/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    if r.status_code != 200:
+        print(f"❌ Admin login failed: {r.status_code}")
+        return 1
+    headers = {'Authorization': f"Bearer {r.json()['session_token']}", 'Origin': ORIGIN}
+
+    suffix = uuid.uuid4().hex[:8]
+    r = requests.post(f"{API_URL}/admin/products", headers=headers, json={
+        "sku": f"UPL-{suffix}",
+        "name_en": f"Upload Shoe {suffix}", "name_ar": "حذاء", "name_tr": "Ayakkabı",
+        "description_en": "d", "description_ar": "d", "description_tr": "d",
+        "price": 10.0, "category": "men",
+        "sizes_stock": [{"size": "42", "stock": 1}],
+        "featured": False
+    })
+    if r.status_code != 200:
+        print(f"❌ Product creation failed: {r.status_code}")
+        return 1
+    product_id = r.json()['id']
+
+    failures = 0
+    try:
+        oversized = PNG + b"\0" * (MAX_UPLOAD_BYTES + 128 * 1024)
+        r = requests.post(f"{API_URL}/admin/products/{product_id}/images", headers=headers,
+                          files={"file": ("big.png", oversized, "image/png")})
+        if r.status_code == 413:
+            print("✅ Oversized upload refused with 413")
+        else:
+            print(f"❌ Oversized upload returned {r.status_code}, expected 413")
+            failures += 1
+        if r.headers.get("access-control-allow-origin"):
+            print("✅ 413 carries access-control-allow-origin")
+        else:
+            print("❌ 413 has no access-control-allow-origin header")
+            failures += 1
+
+        r = requests.post(f"{API_URL}/admin/products/{product_id}/images", headers=headers,
+                          files={"file": ("small.png", PNG, "image/png")})
+        if r.status_code == 200:
+            print("✅ Small upload accepted")
+        else:
+            print(f"❌ Small upload returned {r.status_code}")
+            failures += 1
+    finally:
+        requests.delete(f"{API_URL}/admin/products/{product_id}", headers=headers)
+
+    if failures:
+        print(f"❌ {failures} check(s) failed")
+        return 1
+    print("🎉 Upload limit checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
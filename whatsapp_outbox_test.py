@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+WhatsApp Outbox Test - drives the outbox worker against a local stub of the
+Graph API that answers 429, then 500, then 200 for the first job and 400 for
+the second, and checks retry / dead-letter bookkeeping.
+
+Uses MONGO_URL / DB_NAME from backend/.env and a throwaway collection.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+load_dotenv(Path(__file__).parent / 'backend' / '.env')
+
+from outbox import OutboxWorker, enqueue
+
+class StubGraphAPI(BaseHTTPRequestHandler):
+    responses = {"905550000001": [429, 500, 200], "905550000002": [400]}
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append(body)
+        queue = self.responses.get(body["to"], [200])
+        status = queue.pop(0) if len(queue) > 1 else queue[0]
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"status": status}).encode())
+
+    def log_message(self, *args):
+        pass
+
+async def run():
+    server = HTTPServer(("127.0.0.1", 0), StubGraphAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['WHATSAPP_API_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ['WHATSAPP_TOKEN'] = "test-token"
+    os.environ['WHATSAPP_PHONE_NUMBER_ID'] = "123"
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    collection = client[os.environ['DB_NAME']][f"outbox_test_{uuid.uuid4().hex[:8]}"]
+    worker = OutboxWorker(collection, base_delay=0.05, poll_interval=0.05)
+    try:
+        ok_id = await enqueue(collection, "whatsapp", {"to": "905550000001", "body": "retry me"})
+        bad_id = await enqueue(collection, "whatsapp", {"to": "905550000002", "body": "reject me"})
+        worker.start()
+        for _ in range(100):
+            docs = {d["id"]: d async for d in collection.find({})}
+            if docs[ok_id]["status"] == "sent" and docs[bad_id]["status"] == "dead":
+                break
+            await asyncio.sleep(0.1)
+        await worker.stop()
+
+        results = [
+            ("Job delivered after 429 and 500", docs[ok_id]["status"] == "sent" and docs[ok_id]["attempts"] == 3),
+            ("Permanent 4xx dead-lettered", docs[bad_id]["status"] == "dead" and docs[bad_id]["attempts"] == 1),
+            ("Stub received 4 requests", len(StubGraphAPI.received) == 4),
+        ]
+        for name, success in results:
+            print(f"{'✅ PASS' if success else '❌ FAIL'} - {name}")
+        return 0 if all(success for _, success in results) else 1
+    finally:
+        await collection.drop()
+        client.close()
+        server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))